@@ -1,167 +1,300 @@
-import asyncio
-import re
-from typing import Optional
-from yandex_music import ClientAsync
-from yandex_music.album.album import Album
-from yandex_music.exceptions import NetworkError
-
-
-class YandexMusicFetcher:
-    def __init__(self, token: str):
-        self.token = token
-        self.client = None
-
-    async def connect(self):
-        self.client = ClientAsync(self.token)
-        await self.client.init()
-
-    @staticmethod
-    def extract_album_id(url: str) -> str:
-        if not url:
-            raise ValueError("Album ID or URL cannot be empty")
-
-        pattern = r'music\.yandex\.(ru|com|by|kz)/album/(\d+)(?:/track/\d+)?'
-        match = re.search(pattern, url)
-        
-        return match.group(2) if match else url
-
-    async def fetch_album(self, album_id: str) -> Optional[dict]:
-        try:
-            if not self.client:
-                await self.connect()
-
-            album = await self.client.albums_with_tracks(album_id)
-            
-            label_name = 'N/A'
-            if hasattr(album, 'labels') and album.labels:
-                label_name = ', '.join([label.name for label in album.labels])
-
-            major_name = album.volumes[0][0].major.name if album.volumes and album.volumes[0] and album.volumes[0][0].major else "Unknown"
-
-            distributor_mapping = {
-                "UNIVERSAL_MUSIC": "Universal Music Group",
-                "UNIVERSAL_YANGO": "Universal Music Group (in Israel and Middle East)",
-                "UNIKOP": "Universal Music Group (stolen releases in Russia)",
-                "BELIEVE_DIGITAL": "Believe Digital",
-                "TUNECORE": "TuneCore",
-                "SONY": "Sony Music Entertainment",
-                "WARNER": "Warner Music Group",
-                "BROMA16": "Broma16",
-                "BEGGARS": "Beggars Group",
-                "SYMPHONIC": "Symphonic Distribution",
-                "DISTROKID": "DistroKid",
-                "FRESH_TUNES": "FreshTunes",
-                "LABEL_ENGINE": "Label Engine",
-                "ORCHARD": "The Orchard",
-                "ONERPM": "ONErpm",
-                "WORX": "LabelWorx",
-                "RESERVOIR": "Reservoir Media",
-                "IIP_DDS": "IIP-DDS"
-            }
-            
-            if major_name in distributor_mapping:
-                major_name = distributor_mapping[major_name]
-
-            release_date = album.release_date[:10] if hasattr(album, 'release_date') and album.release_date else "Unknown Date"
-            
-            artists = []
-            if hasattr(album, 'artists'):
-                artists = ', '.join([artist.name for artist in album.artists])
-
-            available_countries = album.regions if hasattr(album, 'regions') else []
-
-            return {
-                'title': getattr(album, 'title', 'Unknown'),
-                'version': getattr(album, 'version', None),
-                'year': getattr(album, 'year', 'N/A'),
-                'label': label_name,
-                'major': major_name,
-                'release_date': release_date,
-                'artists': artists,
-                'volumes': getattr(album, 'volumes', []) if hasattr(album, 'volumes') else [],
-                'available_countries': available_countries
-            }
-        except NetworkError as e:
-            raise ConnectionError(f"Network error: {e}")
-        except Exception as e:
-            raise RuntimeError(f"Failed to fetch album: {e}")
-
-    def format_album_info(self, album_data: dict) -> str:
-        output = []
-        title = album_data['title']
-        if album_data['version']:
-            title += f" ({album_data['version']})"
-        output.append(f"Release Title: {title}")
-        output.append(f"Artist: {album_data['artists']}")
-        output.append(f"Release Date: {album_data['year']}")
-        output.append(f"Release Date: {album_data['release_date']}")
-        output.append("\nTracklist:")
-
-        volumes = album_data.get('volumes', [])
-        if volumes:
-            if len(volumes) > 1:
-                for volume_idx, volume in enumerate(volumes):
-                    output.append(f"\nMedium {volume_idx + 1}:")
-                    for idx, track in enumerate(volume):
-                        artists = ', '.join([artist.name for artist in track.artists])
-                        duration_min = track.duration_ms // 60000
-                        duration_sec = (track.duration_ms % 60000) // 1000
-                        version_text = f" ({track.version})" if track.version else ""
-                        output.append(f"{idx + 1}. {track.title}{version_text} - {artists} ({duration_min}:{duration_sec:02d})")
-            else:
-                volume = volumes[0]
-                for idx, track in enumerate(volume):
-                    artists = ', '.join([artist.name for artist in track.artists])
-                    duration_min = track.duration_ms // 60000
-                    duration_sec = (track.duration_ms % 60000) // 1000
-                    version_text = f" ({track.version})" if track.version else ""
-                    output.append(f"{idx + 1}. {track.title}{version_text} - {artists} ({duration_min}:{duration_sec:02d})")
-        else:
-            output.append("No tracklist available.")
-        
-        output.append(f"\n℗ {album_data['year']} {album_data['label']}")
-        if album_data['available_countries']:
-            output.append(f"Available in: {', '.join(album_data['available_countries'])}")
-        output.append(f"Distributed by {album_data['major']}")
-        
-        return '\n'.join(output)
-
-
-async def main():
-    while True:
-        try:
-            album_input = input("Enter the Yandex Music album ID or URL: ").strip()
-
-            if not album_input:
-                print("Input cannot be empty. Please enter a valid album ID or URL.")
-                continue
-
-            if album_input.lower() in ['exit', 'quit', 'leave']:
-                print("Exiting the program.")
-                break
-
-            if not re.match(r'^\d+$', album_input) and not re.match(r'^https?://', album_input):
-                print("Invalid input. Please enter a valid album ID or URL.")
-                continue
-
-            token = "YOUR_TOKEN"
-
-            fetcher = YandexMusicFetcher(token)
-            album_id = fetcher.extract_album_id(album_input)
-            album_data = await fetcher.fetch_album(album_id)
-            print("\n" + fetcher.format_album_info(album_data))
-
-        except (ValueError, ConnectionError, RuntimeError) as e:
-            print(f"Error: {e}")
-        except KeyboardInterrupt:
-            print("\nOperation cancelled by user")
-            break
-
-        try_again = input("Do you want to try again? (yes/no): ").strip().lower()
-        if try_again in ['yes', 'y']:
-            continue
-        else:
-            break
-
-if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+import argparse
+import asyncio
+import sys
+from collections import deque
+from typing import TYPE_CHECKING, AsyncIterable, AsyncIterator, Iterable, Iterator, Optional, Tuple, Union
+
+import session
+from cache import CacheMiss, MetadataCache, add_cache_arguments, cache_from_args
+from distributors import distributor_name
+from links import extract_id
+from memo import Memo, shared as shared_memo
+from profiling import add_profile_arguments, enable_from_args, profiler
+from records import AlbumRecord, TracklistEntry
+from scheduler import BULK, add_rate_arguments, configure_from_args, priority
+from writers import add_output_arguments, get_writer, open_output
+
+if TYPE_CHECKING:
+    from yandex_music import Album
+
+DESCRIPTION = "Fetch album information from Yandex Music"
+
+
+class YandexMusicFetcher:
+    def __init__(self, token: str, cache: Optional[MetadataCache] = None, memo: Optional[Memo] = None):
+        self.token = token
+        self.client = None
+        self.cache = cache
+        self.memo = memo if memo is not None else shared_memo
+
+    async def connect(self):
+        self.client = await session.get_client(self.token)
+
+    @staticmethod
+    def extract_album_id(url: str) -> str:
+        return extract_id(url, 'album')
+
+    async def fetch_album(self, album_id: str) -> Optional[AlbumRecord]:
+        try:
+            # Albums already in memory skip the cache, cached ones never need the API client
+            if self.cache and self.memo.get(('album', album_id)) is None:
+                cached = self.cache.get('album', album_id)
+                if cached is not None:
+                    return AlbumRecord.from_dict(cached)
+                if self.cache.offline:
+                    raise CacheMiss(f"album {album_id} is not in the cache")
+
+            with profiler.measure('fetch.album'):
+                album = await self._get_album(album_id)
+            if album is None:
+                raise LookupError(f"Album {album_id} not found")
+
+            return self._build_album_record(album)
+        except LookupError:
+            raise
+        except session.not_found_error():
+            raise LookupError(f"Album {album_id} not found")
+        except session.network_error() as e:
+            raise ConnectionError(f"Network error: {e}")
+        except Exception as e:
+            raise RuntimeError(f"Failed to fetch album: {e}")
+
+    def _build_album_record(self, album: 'Album') -> AlbumRecord:
+        label_name = 'N/A'
+        if hasattr(album, 'labels') and album.labels:
+            label_name = ', '.join([label.name for label in album.labels])
+
+        major_name = album.volumes[0][0].major.name if album.volumes and album.volumes[0] and album.volumes[0][0].major else "Unknown"
+
+        major_name = distributor_name(major_name)
+
+        release_date = album.release_date[:10] if hasattr(album, 'release_date') and album.release_date else "Unknown Date"
+        
+        artists = []
+        if hasattr(album, 'artists'):
+            artists = ', '.join([artist.name for artist in album.artists])
+
+        available_countries = album.regions if hasattr(album, 'regions') else []
+
+        # Only the fields the scripts use are kept, not the API objects behind them
+        volumes = tuple(
+            tuple(TracklistEntry.from_track(track) for track in volume)
+            for volume in getattr(album, 'volumes', None) or []
+        )
+
+        return AlbumRecord(
+            id=str(album.id),
+            title=getattr(album, 'title', 'Unknown'),
+            version=getattr(album, 'version', None),
+            year=getattr(album, 'year', 'N/A'),
+            label=label_name,
+            major=major_name,
+            release_date=release_date,
+            artists=artists,
+            available_countries=available_countries,
+            volumes=volumes,
+        )
+
+    async def _get_album(self, album_id: str) -> 'Album':
+        return await self.memo.get_or_fetch(('album', album_id), lambda: self._load_album(album_id))
+
+    async def _load_album(self, album_id: str) -> 'Album':
+        if not self.client:
+            await self.connect()
+
+        album = await self.client.albums_with_tracks(album_id)
+        if self.cache and album:
+            self.cache.put('album', album_id, self._build_album_record(album).to_dict())
+        return album
+
+    async def fetch_albums(self, album_ids: Union[Iterable[str], AsyncIterable[str]], concurrency: int = 8, ordered: bool = False) -> AsyncIterator[Tuple[str, Optional[AlbumRecord], Optional[Exception]]]:
+        if concurrency < 1:
+            raise ValueError("Concurrency must be a positive number")
+
+        # Never more than `concurrency` requests are in flight, so the input can be arbitrarily long
+        window = deque()
+        pending = set()
+        try:
+            if ordered:
+                async for album_id in _aiter(album_ids):
+                    window.append(asyncio.ensure_future(self._fetch_album_result(album_id)))
+                    if len(window) >= concurrency:
+                        yield await window.popleft()
+                while window:
+                    yield await window.popleft()
+            else:
+                async for album_id in _aiter(album_ids):
+                    pending.add(asyncio.ensure_future(self._fetch_album_result(album_id)))
+                    if len(pending) >= concurrency:
+                        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                        for task in done:
+                            yield task.result()
+                while pending:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        yield task.result()
+        finally:
+            for task in (*window, *pending):
+                task.cancel()
+
+    async def _fetch_album_result(self, album_id: str) -> Tuple[str, Optional[AlbumRecord], Optional[Exception]]:
+        try:
+            return album_id, await self.fetch_album(album_id), None
+        except (LookupError, ConnectionError, RuntimeError) as e:
+            return album_id, None, e
+
+    @profiler.timed('format.album')
+    def format_album_info(self, album: AlbumRecord) -> str:
+        output = []
+        title = album.title
+        if album.version:
+            title += f" ({album.version})"
+        output.append(f"Release Title: {title}")
+        output.append(f"Artist: {album.artists}")
+        output.append(f"Release Date: {album.year}")
+        output.append(f"Release Date: {album.release_date}")
+        output.append("\nTracklist:")
+
+        volumes = album.volumes
+        if volumes:
+            if len(volumes) > 1:
+                for volume_idx, volume in enumerate(volumes):
+                    output.append(f"\nMedium {volume_idx + 1}:")
+                    for idx, track in enumerate(volume):
+                        duration_min = track.duration_ms // 60000
+                        duration_sec = (track.duration_ms % 60000) // 1000
+                        version_text = f" ({track.version})" if track.version else ""
+                        output.append(f"{idx + 1}. {track.title}{version_text} - {track.artists} ({duration_min}:{duration_sec:02d})")
+            else:
+                volume = volumes[0]
+                for idx, track in enumerate(volume):
+                    duration_min = track.duration_ms // 60000
+                    duration_sec = (track.duration_ms % 60000) // 1000
+                    version_text = f" ({track.version})" if track.version else ""
+                    output.append(f"{idx + 1}. {track.title}{version_text} - {track.artists} ({duration_min}:{duration_sec:02d})")
+        else:
+            output.append("No tracklist available.")
+        
+        output.append(f"\n℗ {album.year} {album.label}")
+        if album.available_countries:
+            output.append(f"Available in: {', '.join(album.available_countries)}")
+        output.append(f"Distributed by {album.major}")
+        
+        return '\n'.join(output)
+
+
+async def _aiter(items: Union[Iterable[str], AsyncIterable[str]]) -> AsyncIterator[str]:
+    if hasattr(items, '__aiter__'):
+        async for item in items:
+            yield item
+    else:
+        for item in items:
+            yield item
+
+
+def read_album_ids(lines: Iterable[str]) -> Iterator[str]:
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+
+        try:
+            album_id = YandexMusicFetcher.extract_album_id(line)
+        except ValueError:
+            print(f"Skipping invalid album ID or URL: {line}", file=sys.stderr)
+            continue
+
+        yield album_id
+
+
+async def batch_main(source: str, concurrency: int, ordered: bool, cache: Optional[MetadataCache] = None,
+                     output_format: str = 'text', output: Optional[str] = None):
+    token = "YOUR_TOKEN"
+
+    fetcher = YandexMusicFetcher(token, cache)
+    stream = sys.stdin if source == '-' else open(source, encoding='utf-8')
+    out = open_output(output)
+    writer = get_writer(output_format, 'album', out, fetcher.format_album_info)
+    try:
+        async for album_id, album_data, error in fetcher.fetch_albums(read_album_ids(stream), concurrency, ordered):
+            if error:
+                print(f"Error: {album_id}: {error}", file=sys.stderr, flush=True)
+                continue
+            writer.write(album_data)
+    except (ValueError, ConnectionError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+    finally:
+        writer.close()
+        if out is not sys.stdout:
+            out.close()
+        if stream is not sys.stdin:
+            stream.close()
+
+
+async def main(cache: Optional[MetadataCache] = None):
+    token = "YOUR_TOKEN"
+    fetcher = YandexMusicFetcher(token, cache)
+
+    while True:
+        try:
+            album_input = input("Enter the Yandex Music album ID or URL: ").strip()
+
+            if not album_input:
+                print("Input cannot be empty. Please enter a valid album ID or URL.")
+                continue
+
+            if album_input.lower() in ['exit', 'quit', 'leave']:
+                print("Exiting the program.")
+                break
+
+            album_id = fetcher.extract_album_id(album_input)
+            album_data = await fetcher.fetch_album(album_id)
+            print("\n" + fetcher.format_album_info(album_data))
+
+        except (ValueError, LookupError, ConnectionError, RuntimeError) as e:
+            print(f"Error: {e}")
+        except KeyboardInterrupt:
+            print("\nOperation cancelled by user")
+            break
+
+        try_again = input("Do you want to try again? (yes/no): ").strip().lower()
+        if try_again in ['yes', 'y']:
+            continue
+        else:
+            break
+
+
+def add_arguments(parser):
+    parser.add_argument('--batch', metavar='FILE', help="read album IDs or URLs from FILE (one per line, '-' for stdin) instead of prompting")
+    parser.add_argument('--concurrency', type=int, default=8, help="maximum number of albums fetched at the same time in batch mode (default: 8)")
+    parser.add_argument('--ordered', action='store_true', help="print albums in input order instead of completion order")
+    add_output_arguments(parser)
+    add_cache_arguments(parser)
+    add_rate_arguments(parser)
+    add_profile_arguments(parser)
+
+
+def run_cli(args, parser):
+    enable_from_args(args)
+
+    try:
+        cache = cache_from_args(args)
+        configure_from_args(args)
+    except ValueError as e:
+        parser.error(str(e))
+
+    try:
+        if args.batch:
+            with priority(BULK):
+                session.run(batch_main(args.batch, args.concurrency, args.ordered, cache, args.format, args.output))
+        else:
+            session.run(main(cache))
+    finally:
+        if cache:
+            cache.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    add_arguments(parser)
+    run_cli(parser.parse_args(), parser)
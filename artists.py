@@ -0,0 +1,123 @@
+import argparse
+import sys
+from typing import AsyncIterator, Optional, Tuple
+
+import session
+from albums import YandexMusicFetcher
+from cache import MetadataCache, add_cache_arguments, cache_from_args
+from links import extract_id
+from profiling import add_profile_arguments, enable_from_args
+from records import AlbumRecord
+from scheduler import BULK, INTERACTIVE, add_rate_arguments, configure_from_args, priority
+from writers import add_output_arguments, get_writer, open_output
+
+DESCRIPTION = "Fetch every release of a Yandex Music artist"
+
+
+class YandexMusicArtistCrawler:
+    def __init__(self, token: str, cache: Optional[MetadataCache] = None):
+        self.token = token
+        self.fetcher = YandexMusicFetcher(token, cache)
+
+    @staticmethod
+    def extract_artist_id(url: str) -> str:
+        return extract_id(url, 'artist')
+
+    async def iter_album_ids(self, artist_id: str, page_size: int = 100) -> AsyncIterator[str]:
+        seen = set()
+        page = 0
+        while True:
+            try:
+                if not self.fetcher.client:
+                    await self.fetcher.connect()
+                # Every album fetch after this page waits for it, so it goes ahead of the ones already queued
+                with priority(INTERACTIVE):
+                    result = await self.fetcher.client.artists_direct_albums(artist_id, page=page, page_size=page_size)
+            except session.network_error() as e:
+                raise ConnectionError(f"Network error: {e}")
+            except Exception as e:
+                raise RuntimeError(f"Failed to fetch discography: {e}")
+
+            if not result or not result.albums:
+                return
+
+            for album in result.albums:
+                album_id = str(album.id)
+                # The listing can shift while it is being paged, so an album may show up twice
+                if album_id not in seen:
+                    seen.add(album_id)
+                    yield album_id
+
+            pager = result.pager
+            if pager is None or (page + 1) * pager.per_page >= pager.total:
+                return
+            page += 1
+
+    async def crawl(self, artist_id: str, concurrency: int = 8, ordered: bool = False,
+                    page_size: int = 100) -> AsyncIterator[Tuple[str, Optional[AlbumRecord], Optional[Exception]]]:
+        # Pages are requested only as the album pipeline asks for more IDs, so output starts after the first page
+        async for result in self.fetcher.fetch_albums(self.iter_album_ids(artist_id, page_size), concurrency, ordered):
+            yield result
+
+
+async def main(artist_input: str, concurrency: int, ordered: bool, page_size: int, cache: Optional[MetadataCache] = None,
+               output_format: str = 'text', output: Optional[str] = None):
+    token = "YOUR_TOKEN"
+
+    crawler = YandexMusicArtistCrawler(token, cache)
+    try:
+        artist_id = crawler.extract_artist_id(artist_input)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return
+
+    out = open_output(output)
+    writer = get_writer(output_format, 'album', out, crawler.fetcher.format_album_info)
+    try:
+        async for album_id, album_data, error in crawler.crawl(artist_id, concurrency, ordered, page_size):
+            if error:
+                print(f"Error: {album_id}: {error}", file=sys.stderr, flush=True)
+                continue
+            writer.write(album_data)
+    except (ValueError, ConnectionError, RuntimeError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+    finally:
+        writer.close()
+        if out is not sys.stdout:
+            out.close()
+
+
+def add_arguments(parser):
+    parser.add_argument('artist', nargs='?', help="artist ID or URL (prompted for if omitted)")
+    parser.add_argument('--concurrency', type=int, default=8, help="maximum number of albums fetched at the same time (default: 8)")
+    parser.add_argument('--ordered', action='store_true', help="print releases in discography order instead of completion order")
+    parser.add_argument('--page-size', type=int, default=100, help="number of releases requested per discography page (default: 100)")
+    add_output_arguments(parser)
+    add_cache_arguments(parser)
+    add_rate_arguments(parser)
+    add_profile_arguments(parser)
+
+
+def run_cli(args, parser):
+    enable_from_args(args)
+
+    artist_input = args.artist or input("Enter the Yandex Music artist ID or URL: ").strip()
+
+    try:
+        cache = cache_from_args(args)
+        configure_from_args(args)
+    except ValueError as e:
+        parser.error(str(e))
+
+    try:
+        with priority(BULK):
+            session.run(main(artist_input, args.concurrency, args.ordered, args.page_size, cache, args.format, args.output))
+    finally:
+        if cache:
+            cache.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    add_arguments(parser)
+    run_cli(parser.parse_args(), parser)
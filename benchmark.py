@@ -0,0 +1,407 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional
+from urllib.parse import parse_qs, urlparse
+
+import session
+import top
+from albums import YandexMusicFetcher
+from cache import MetadataCache
+from memo import Memo
+from scheduler import DEFAULT_RETRIES, scheduler
+from tracks import YandexMusicTrackFetcher
+from videoshots import YandexMusicTrackFetcher as YandexMusicVideoFetcher
+
+TOKEN = "BENCHMARK_TOKEN"
+
+TRACKS_PER_ALBUM = 12
+
+
+def fake_track(track_id: int, album_id: int) -> dict:
+    rng = random.Random(track_id)
+    return {
+        'id': str(track_id),
+        'title': f"Track {track_id}",
+        'durationMs': rng.randint(90000, 420000),
+        'available': True,
+        'artists': [{'id': album_id % 1000, 'name': f"Artist {album_id % 1000}"}],
+        'contentWarning': 'explicit' if rng.random() < 0.2 else None,
+        'type': 'music',
+        'trackSource': 'OWN',
+        'trackSharingFlag': 'COVER_ONLY',
+        'coverUri': f"avatars.yandex.net/get-music-content/{album_id}/%%",
+        'backgroundVideoUri': f"https://strm.yandex.ru/vh-canvas/{track_id}.mp4" if track_id % 4 == 0 else None,
+        'major': {'id': 1, 'name': rng.choice(['SONY', 'WARNER', 'UNIVERSAL_MUSIC', 'BELIEVE_DIGITAL', 'DISTROKID'])},
+        'albums': [fake_album_meta(album_id)],
+    }
+
+
+def fake_album_meta(album_id: int) -> dict:
+    rng = random.Random(album_id)
+    return {
+        'id': album_id,
+        'title': f"Album {album_id}",
+        'year': rng.randint(1970, 2025),
+        'releaseDate': f"{rng.randint(1970, 2025)}-01-01T00:00:00+03:00",
+        'labels': [{'id': album_id % 97, 'name': f"Label {album_id % 97}"}],
+        'regions': rng.sample(['RU', 'KZ', 'BY', 'UZ', 'AM', 'GE', 'IL'], rng.randint(1, 7)),
+        'artists': [{'id': album_id % 1000, 'name': f"Artist {album_id % 1000}"}],
+    }
+
+
+def fake_album(album_id: int) -> dict:
+    album = fake_album_meta(album_id)
+    album['volumes'] = [[fake_track(album_id * 100 + idx, album_id) for idx in range(TRACKS_PER_ALBUM)]]
+    return album
+
+
+ACCOUNT_STATUS = {
+    'account': {'uid': 1, 'login': 'benchmark', 'now': '2020-01-01T00:00:00+03:00', 'serviceAvailable': True},
+    'permissions': {'until': '2030-01-01T00:00:00+03:00', 'values': [], 'default': []},
+}
+
+TOP_ARTISTS = {'artists': [{'name': f"Artist {idx}", 'playCount': 100 - idx} for idx in range(10)]}
+
+
+class MockApiHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _respond(self, status: int, result=None):
+        body = json.dumps({'invocationInfo': {'hostname': 'benchmark', 'req-id': 'benchmark'}, 'result': result}).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _simulate(self) -> bool:
+        server = self.server
+        if server.latency:
+            time.sleep(max(0.0, random.gauss(server.latency, server.latency * server.jitter)))
+        roll = random.random()
+        if roll < server.throttle_rate:
+            self._respond(429, {'name': 'too-many-requests', 'message': 'Too many requests'})
+            return False
+        if roll < server.throttle_rate + server.error_rate:
+            self._respond(500, {'name': 'internal-error', 'message': 'Internal error'})
+            return False
+        return True
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        # Authentication is left out of error injection so every run gets to the part being measured
+        if path == '/account/status':
+            return self._respond(200, ACCOUNT_STATUS)
+        if not self._simulate():
+            return
+
+        match = re.match(r'^/albums/(\d+)/with-tracks$', path)
+        if match:
+            return self._respond(200, fake_album(int(match.group(1))))
+        # Only this top.py endpoint answers, the other two return 404 like they do for most accounts
+        if path == '/users/me/top/artists':
+            return self._respond(200, TOP_ARTISTS)
+        self._respond(404, {'name': 'not-found', 'message': 'Not found'})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        form = parse_qs(self.rfile.read(length).decode('utf-8'))
+        path = urlparse(self.path).path
+        if not self._simulate():
+            return
+
+        if path == '/tracks':
+            track_ids = [item for value in form.get('track-ids', []) for item in value.split(',')]
+            tracks = [fake_track(int(track_id.split(':')[0]), int(track_id.split(':')[0]) // 100) for track_id in track_ids]
+            return self._respond(200, tracks)
+        self._respond(404, {'name': 'not-found', 'message': 'Not found'})
+
+
+class MockApiServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0, throttle_rate: float = 0.0):
+        super().__init__(('127.0.0.1', 0), MockApiHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class Result:
+    def __init__(self, scenario: str, setting: str):
+        self.scenario = scenario
+        self.setting = setting
+        self.items = 0
+        self.errors = 0
+        self.latencies: List[float] = []
+        self.elapsed = 0.0
+        self.peak_memory = 0
+
+    def to_dict(self) -> dict:
+        return {
+            'scenario': self.scenario,
+            'setting': self.setting,
+            'items': self.items,
+            'errors': self.errors,
+            'throughput': self.items / self.elapsed if self.elapsed else 0.0,
+            'p50_ms': percentile(self.latencies, 50) * 1000,
+            'p95_ms': percentile(self.latencies, 95) * 1000,
+            'p99_ms': percentile(self.latencies, 99) * 1000,
+            'peak_memory_mb': self.peak_memory / (1024 * 1024),
+        }
+
+
+class TimedAlbumFetcher(YandexMusicFetcher):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.latencies = []
+
+    async def _fetch_album_result(self, album_id: str):
+        start = time.perf_counter()
+        result = await super()._fetch_album_result(album_id)
+        self.latencies.append(time.perf_counter() - start)
+        return result
+
+
+class TimedTrackFetcher(YandexMusicTrackFetcher):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.latencies = []
+
+    async def _get_tracks(self, track_ids):
+        start = time.perf_counter()
+        try:
+            return await super()._get_tracks(track_ids)
+        finally:
+            self.latencies.append(time.perf_counter() - start)
+
+
+async def measure(scenario: str, setting: str, run) -> Result:
+    result = Result(scenario, setting)
+    tracemalloc.reset_peak()
+    start = time.perf_counter()
+    await run(result)
+    result.elapsed = time.perf_counter() - start
+    result.peak_memory = tracemalloc.get_traced_memory()[1]
+    return result
+
+
+async def bench_albums(album_count: int, concurrency: int, ordered: bool) -> Result:
+    # A fresh memo per run, otherwise every run after the first would be answered from memory
+    fetcher = TimedAlbumFetcher(TOKEN, memo=Memo())
+    album_ids = [str(1000 + idx) for idx in range(album_count)]
+
+    async def run(result: Result):
+        async for _, album, error in fetcher.fetch_albums(album_ids, concurrency, ordered):
+            result.items += 1
+            result.errors += error is not None
+        result.latencies = fetcher.latencies
+
+    return await measure('albums', f"concurrency={concurrency}{' ordered' if ordered else ''}", run)
+
+
+async def bench_tracks(track_count: int, batch_size: int) -> Result:
+    fetcher = TimedTrackFetcher(TOKEN, memo=Memo())
+    track_ids = [str(500000 + idx) for idx in range(track_count)]
+
+    async def run(result: Result):
+        async for _, track, error in fetcher.fetch_tracks(track_ids, batch_size):
+            result.items += 1
+            result.errors += error is not None
+        result.latencies = fetcher.latencies
+
+    return await measure('tracks', f"batch_size={batch_size}", run)
+
+
+async def bench_videoshots(track_count: int, concurrency: int) -> Result:
+    fetcher = YandexMusicVideoFetcher(TOKEN, memo=Memo())
+    track_ids = [str(700000 + idx) for idx in range(track_count)]
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def lookup(track_id: str, result: Result):
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await fetcher.fetch_track_videos(track_id)
+            except RuntimeError as e:
+                # Tracks without a videoshot are an expected answer, not a failure
+                if 'No video found' not in str(e):
+                    result.errors += 1
+            except ConnectionError:
+                result.errors += 1
+            result.latencies.append(time.perf_counter() - start)
+            result.items += 1
+
+    async def run(result: Result):
+        await asyncio.gather(*(lookup(track_id, result) for track_id in track_ids))
+
+    return await measure('videoshots', f"concurrency={concurrency}", run)
+
+
+async def bench_top(iterations: int, base_url: str) -> Result:
+    async def run(result: Result):
+        # The first lookup probes every endpoint and the rest reuse the saved one, like repeated real runs
+        endpoint_cache = os.path.join(tmp, 'top-endpoint.json')
+        for _ in range(iterations):
+            start = time.perf_counter()
+            data = await top.lookup_top_artists(TOKEN, base_url, endpoint_cache=endpoint_cache)
+            result.latencies.append(time.perf_counter() - start)
+            result.items += 1
+            result.errors += data is None
+
+    with tempfile.TemporaryDirectory() as tmp:
+        return await measure('top', f"iterations={iterations}", run)
+
+
+async def bench_startup(runs: int) -> List[Result]:
+    # Cold start of fresh interpreters, the way shell loops and cron jobs run the scripts
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    yam = os.path.join(script_dir, 'yam.py')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_path = os.path.join(tmp, 'cache.sqlite3')
+        ids_path = os.path.join(tmp, 'ids.txt')
+        cache = MetadataCache(cache_path)
+        try:
+            await YandexMusicFetcher(TOKEN, cache, Memo()).fetch_album('1000')
+        finally:
+            cache.close()
+        with open(ids_path, 'w', encoding='utf-8') as stream:
+            stream.write('1000\n')
+
+        commands = [
+            ('import yandex_music', ['-c', 'import yandex_music']),
+            ('yam --help', [yam, '--help']),
+            ('yam album --help', [yam, 'album', '--help']),
+            ('yam album cached', [yam, 'album', '--batch', ids_path, '--offline', '--cache-path', cache_path, '--format', 'ndjson']),
+        ]
+
+        results = []
+        for setting, command in commands:
+            result = Result('startup', setting)
+            start = time.perf_counter()
+            for _ in range(runs):
+                run_start = time.perf_counter()
+                completed = await asyncio.to_thread(subprocess.run, [sys.executable, *command], cwd=script_dir,
+                                                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                result.latencies.append(time.perf_counter() - run_start)
+                result.items += 1
+                result.errors += completed.returncode != 0
+            result.elapsed = time.perf_counter() - start
+            results.append(result)
+        return results
+
+
+async def run_benchmarks(args, base_url: str) -> List[Result]:
+    results = []
+    # Authenticate once up front so the first scenario does not pay for client.init()
+    await session.get_client(TOKEN)
+
+    for concurrency in args.concurrency:
+        results.append(await bench_albums(args.albums, concurrency, args.ordered))
+    for batch_size in args.batch_size:
+        results.append(await bench_tracks(args.tracks, batch_size))
+    for concurrency in args.concurrency:
+        results.append(await bench_videoshots(args.videoshots, concurrency))
+    if args.top:
+        results.append(await bench_top(args.top, base_url))
+    if args.startup:
+        results.extend(await bench_startup(args.startup))
+    return results
+
+
+def format_results(results: List[Result]) -> str:
+    output = [f"{'scenario':<11}{'setting':<22}{'items':>7}{'errors':>8}{'items/s':>10}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'peak MB':>9}"]
+    for result in results:
+        row = result.to_dict()
+        output.append(
+            f"{row['scenario']:<11}{row['setting']:<22}{row['items']:>7}{row['errors']:>8}{row['throughput']:>10.1f}"
+            f"{row['p50_ms']:>9.1f}{row['p95_ms']:>9.1f}{row['p99_ms']:>9.1f}{row['peak_memory_mb']:>9.2f}"
+        )
+    return '\n'.join(output)
+
+
+def int_list(value: str) -> List[int]:
+    try:
+        items = [int(item) for item in value.split(',') if item]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected a comma-separated list of numbers, got {value!r}")
+    if not items or min(items) < 1:
+        raise argparse.ArgumentTypeError("values must be positive numbers")
+    return items
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Benchmark the fetchers against a local stand-in for the Yandex Music API")
+    parser.add_argument('--albums', type=int, default=200, help="albums fetched per album run (default: 200)")
+    parser.add_argument('--tracks', type=int, default=2000, help="tracks fetched per track run (default: 2000)")
+    parser.add_argument('--videoshots', type=int, default=200, help="tracks checked per videoshot run (default: 200)")
+    parser.add_argument('--top', type=int, default=20, help="top.py lookups to time, 0 to skip (default: 20)")
+    parser.add_argument('--startup', type=int, default=10, help="cold starts timed per command, 0 to skip (default: 10)")
+    parser.add_argument('--concurrency', type=int_list, default=[1, 8, 32], help="comma-separated concurrency levels (default: 1,8,32)")
+    parser.add_argument('--batch-size', type=int_list, default=[1, 50, 200], help="comma-separated track batch sizes (default: 1,50,200)")
+    parser.add_argument('--ordered', action='store_true', help="keep input order in the album runs")
+    parser.add_argument('--latency', type=float, default=0.02, help="mean server latency in seconds (default: 0.02)")
+    parser.add_argument('--jitter', type=float, default=0.25, help="latency standard deviation as a fraction of the mean (default: 0.25)")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="fraction of requests answered with HTTP 500")
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help="fraction of requests answered with HTTP 429")
+    parser.add_argument('--rate', type=float, default=10000.0,
+                        help="API requests per second the shared scheduler starts from; the default measures the fetchers, not the limiter (default: 10000)")
+    parser.add_argument('--retries', type=int, default=DEFAULT_RETRIES, help=f"retries per throttled or failed request (default: {DEFAULT_RETRIES})")
+    parser.add_argument('--seed', type=int, default=0, help="random seed for latency and error injection")
+    parser.add_argument('--json', action='store_true', help="print results as JSON")
+    args = parser.parse_args(argv)
+
+    random.seed(args.seed)
+    scheduler.configure(args.rate, args.rate, args.retries)
+    tracemalloc.start()
+    with MockApiServer(args.latency, args.jitter, args.error_rate, args.throttle_rate) as server:
+        session.api_base_url = server.url
+        results = session.run(run_benchmarks(args, server.url))
+
+    if args.json:
+        print(json.dumps([result.to_dict() for result in results], indent=2))
+    else:
+        print(format_results(results))
+
+
+if __name__ == "__main__":
+    main()
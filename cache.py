@@ -0,0 +1,175 @@
+import json
+import os
+import sqlite3
+import time
+from typing import Dict, Optional
+
+from profiling import profiler
+
+CACHE_DIR = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'), 'yam-scripts')
+
+# User data such as the watchlist and the region index, kept apart from the cache so clearing the cache does not lose it
+DATA_DIR = os.path.join(os.environ.get('XDG_DATA_HOME') or os.path.join(os.path.expanduser('~'), '.local', 'share'), 'yam-scripts')
+
+DEFAULT_CACHE_PATH = os.path.join(CACHE_DIR, 'metadata.sqlite3')
+
+# Seconds an entry stays fresh; release metadata rarely changes, videoshots come and go more often
+DEFAULT_TTL = {
+    'album': 7 * 24 * 3600,
+    'track': 7 * 24 * 3600,
+    'videoshot': 24 * 3600,
+}
+
+DEFAULT_MAX_SIZE = 512 * 1024 * 1024
+
+MODES = ('default', 'bypass', 'refresh', 'offline')
+
+# Albums and tracks are stored as the records the scripts print rather than raw API payloads,
+# so a cache hit never needs the API client; entries written in an older layout are dropped
+SCHEMA_VERSION = 2
+
+
+class CacheMiss(LookupError):
+    pass
+
+
+class MetadataCache:
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, ttl: Optional[Dict[str, float]] = None,
+                 max_size: int = DEFAULT_MAX_SIZE, mode: str = 'default'):
+        if mode not in MODES:
+            raise ValueError(f"Unknown cache mode: {mode}")
+
+        self.path = path
+        self.ttl = {**DEFAULT_TTL, **(ttl or {})}
+        self.max_size = max_size
+        self.mode = mode
+        self._db = None
+        self._size = None
+
+    @property
+    def offline(self) -> bool:
+        return self.mode == 'offline'
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._db = sqlite3.connect(self.path)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute('PRAGMA synchronous=NORMAL')
+            self._db.execute('''
+                CREATE TABLE IF NOT EXISTS entries (
+                    kind TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    payload BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    fetched_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL,
+                    PRIMARY KEY (kind, key)
+                ) WITHOUT ROWID
+            ''')
+            self._db.execute('CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at)')
+            if self._db.execute('PRAGMA user_version').fetchone()[0] < SCHEMA_VERSION:
+                self._db.execute('DELETE FROM entries')
+                self._db.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+                self._db.commit()
+            self._size = self._db.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+        return self._db
+
+    def get(self, kind: str, key: str):
+        if self.mode in ('bypass', 'refresh'):
+            return None
+
+        start = time.perf_counter()
+        db = self._connect()
+        row = db.execute('SELECT payload, fetched_at FROM entries WHERE kind = ? AND key = ?', (kind, key)).fetchone()
+        if row is None:
+            profiler.record(f'cache.miss.{kind}', time.perf_counter() - start)
+            return None
+
+        payload, fetched_at = row
+        now = time.time()
+        # Offline runs would rather show stale data than nothing at all
+        if not self.offline and now - fetched_at > self.ttl.get(kind, 0):
+            profiler.record(f'cache.stale.{kind}', time.perf_counter() - start)
+            return None
+
+        db.execute('UPDATE entries SET accessed_at = ? WHERE kind = ? AND key = ?', (now, kind, key))
+        db.commit()
+        value = json.loads(payload)
+        profiler.record(f'cache.hit.{kind}', time.perf_counter() - start, len(payload))
+        return value
+
+    def put(self, kind: str, key: str, value):
+        if self.mode in ('bypass', 'offline'):
+            return
+
+        start = time.perf_counter()
+        db = self._connect()
+        payload = json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        now = time.time()
+
+        old = db.execute('SELECT size FROM entries WHERE kind = ? AND key = ?', (kind, key)).fetchone()
+        db.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)', (kind, key, payload, len(payload), now, now))
+        self._size += len(payload) - (old[0] if old else 0)
+
+        if self._size > self.max_size:
+            self._evict()
+        db.commit()
+        profiler.record(f'cache.put.{kind}', time.perf_counter() - start, len(payload))
+
+    def items(self, kind: str):
+        # Every stored entry of one kind, fresh or stale, for building indexes over what has been fetched so far
+        if self.mode == 'bypass':
+            return
+
+        db = self._connect()
+        for key, payload in db.execute('SELECT key, payload FROM entries WHERE kind = ?', (kind,)):
+            yield key, json.loads(payload)
+
+    def _evict(self):
+        # Drop least recently used entries until there is some headroom, so eviction does not run on every put
+        target = self.max_size * 0.9
+        rows = self._db.execute('SELECT kind, key, size FROM entries ORDER BY accessed_at')
+        victims = []
+        for kind, key, size in rows:
+            if self._size <= target:
+                break
+            victims.append((kind, key))
+            self._size -= size
+        self._db.executemany('DELETE FROM entries WHERE kind = ? AND key = ?', victims)
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+def add_cache_arguments(parser):
+    group = parser.add_argument_group('cache')
+    modes = group.add_mutually_exclusive_group()
+    modes.add_argument('--no-cache', dest='cache_mode', action='store_const', const='bypass', default='default',
+                       help="do not read from or write to the local metadata cache")
+    modes.add_argument('--refresh', dest='cache_mode', action='store_const', const='refresh',
+                       help="ignore cached entries and store fresh copies of everything fetched")
+    modes.add_argument('--offline', dest='cache_mode', action='store_const', const='offline',
+                       help="answer only from the local cache, never touching the network")
+    group.add_argument('--cache-path', default=DEFAULT_CACHE_PATH, help=f"cache database location (default: {DEFAULT_CACHE_PATH})")
+    group.add_argument('--cache-ttl', action='append', default=[], metavar='KIND=SECONDS',
+                       help="override how long album, track or videoshot entries stay fresh (can be repeated)")
+    group.add_argument('--cache-max-size', type=int, default=DEFAULT_MAX_SIZE // (1024 * 1024), metavar='MB',
+                       help=f"evict least recently used entries above this size (default: {DEFAULT_MAX_SIZE // (1024 * 1024)})")
+
+
+def cache_from_args(args) -> Optional[MetadataCache]:
+    if args.cache_mode == 'bypass':
+        return None
+
+    ttl = {}
+    for item in args.cache_ttl:
+        kind, _, seconds = item.partition('=')
+        if kind not in DEFAULT_TTL or not seconds.isdigit():
+            raise ValueError(f"Invalid cache TTL: {item}")
+        ttl[kind] = int(seconds)
+
+    return MetadataCache(args.cache_path, ttl, args.cache_max_size * 1024 * 1024, args.cache_mode)
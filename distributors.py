@@ -0,0 +1,25 @@
+# Distributor codes from the `major` field mapped to the names shown to the user
+DISTRIBUTORS = {
+    "UNIVERSAL_MUSIC": "Universal Music Group",
+    "UNIVERSAL_YANGO": "Universal Music Group (in Israel and Middle East)",
+    "UNIKOP": "Universal Music Group (stolen releases in Russia)",
+    "BELIEVE_DIGITAL": "Believe Digital",
+    "TUNECORE": "TuneCore",
+    "SONY": "Sony Music Entertainment",
+    "WARNER": "Warner Music Group",
+    "BROMA16": "Broma16",
+    "BEGGARS": "Beggars Group",
+    "SYMPHONIC": "Symphonic Distribution",
+    "DISTROKID": "DistroKid",
+    "FRESH_TUNES": "FreshTunes",
+    "LABEL_ENGINE": "Label Engine",
+    "ORCHARD": "The Orchard",
+    "ONERPM": "ONErpm",
+    "WORX": "LabelWorx",
+    "RESERVOIR": "Reservoir Media",
+    "IIP_DDS": "IIP-DDS"
+}
+
+
+def distributor_name(major: str) -> str:
+    return DISTRIBUTORS.get(major, major)
@@ -0,0 +1,235 @@
+import argparse
+import json
+import os
+import sys
+import time
+from typing import List, Optional, TextIO
+
+import session
+from cache import CacheMiss, MetadataCache, add_cache_arguments, cache_from_args
+from profiling import add_profile_arguments, enable_from_args, profiler
+from scheduler import BULK, add_rate_arguments, configure_from_args, priority
+from tracks import BatchError, YandexMusicTrackFetcher
+from writers import FORMATS, CsvWriter, get_writer
+
+DESCRIPTION = "Export every track you liked on Yandex Music, resuming where an interrupted run stopped"
+
+DEFAULT_BATCH_SIZE = 500
+
+CHECKPOINT_VERSION = 1
+
+
+class Checkpoint:
+    # An append-only file next to the output. The first line is the list of liked tracks taken when the export
+    # started, so batches keep their boundaries however the library changes meanwhile; every finished batch
+    # then adds a line with the number of tracks done and the output size at that point. A line cut short by a
+    # crash is ignored, and the output is cut back to the last size recorded, dropping any half-written batch
+    __slots__ = ('path', 'track_ids', 'batch_size', 'output_format', 'created_at', 'done', 'offset', '_stream')
+
+    def __init__(self, path: str, track_ids: List[str], batch_size: int, output_format: str,
+                 created_at: Optional[float] = None, done: int = 0, offset: int = 0):
+        self.path = path
+        self.track_ids = track_ids
+        self.batch_size = batch_size
+        self.output_format = output_format
+        self.created_at = created_at or time.time()
+        self.done = done
+        self.offset = offset
+        self._stream = None
+
+    @classmethod
+    def load(cls, path: str) -> Optional['Checkpoint']:
+        try:
+            with open(path, encoding='utf-8') as stream:
+                lines = stream.read().split('\n')
+        except FileNotFoundError:
+            return None
+
+        try:
+            header = json.loads(lines[0])
+        except ValueError:
+            # The header is written in one go before anything else, so there is nothing to resume from
+            return None
+        if header.get('version') != CHECKPOINT_VERSION:
+            raise ValueError(f"Checkpoint {path} was written by another version, remove it or use --restart")
+
+        checkpoint = cls(path, header['track_ids'], header['batch_size'], header['format'], header['created_at'])
+        for line in lines[1:]:
+            try:
+                progress = json.loads(line)
+            except ValueError:
+                break
+            checkpoint.done, checkpoint.offset = progress['done'], progress['offset']
+        return checkpoint
+
+    def start(self):
+        with open(self.path + '.tmp', 'w', encoding='utf-8') as stream:
+            json.dump({'version': CHECKPOINT_VERSION, 'created_at': self.created_at, 'format': self.output_format,
+                       'batch_size': self.batch_size, 'track_ids': self.track_ids}, stream, separators=(',', ':'))
+            stream.write('\n')
+            stream.flush()
+            os.fsync(stream.fileno())
+        os.replace(self.path + '.tmp', self.path)
+
+    def advance(self, done: int, out: TextIO):
+        # The output reaches the disk before the checkpoint says it did
+        out.flush()
+        os.fsync(out.fileno())
+        self.done, self.offset = done, out.tell()
+
+        if self._stream is None:
+            self._stream = open(self.path, 'a', encoding='utf-8')
+        self._stream.write(json.dumps({'done': self.done, 'offset': self.offset}) + '\n')
+        self._stream.flush()
+        os.fsync(self._stream.fileno())
+
+    def close(self):
+        if self._stream is not None:
+            self._stream.close()
+            self._stream = None
+
+    def remove(self):
+        self.close()
+        os.remove(self.path)
+
+
+def checkpoint_path(output: str) -> str:
+    return output + '.checkpoint'
+
+
+async def fetch_liked_track_ids(fetcher: YandexMusicTrackFetcher) -> List[str]:
+    # "track:album" pairs, most recently liked first, as the service lists them
+    try:
+        if not fetcher.client:
+            await fetcher.connect()
+        with profiler.measure('fetch.likes'):
+            likes = await fetcher.client.users_likes_tracks()
+    except session.network_error() as e:
+        raise ConnectionError(f"Network error: {e}")
+    except Exception as e:
+        raise RuntimeError(f"Failed to fetch liked tracks: {e}")
+    return [short.track_id for short in likes.tracks] if likes else []
+
+
+async def export_likes(output: str, output_format: str = 'ndjson', batch_size: int = DEFAULT_BATCH_SIZE,
+                       cache: Optional[MetadataCache] = None, restart: bool = False) -> bool:
+    # Returns True once everything is exported; otherwise the checkpoint is left for the next run
+    token = "YOUR_TOKEN"
+
+    fetcher = YandexMusicTrackFetcher(token, cache)
+    path = checkpoint_path(output)
+    checkpoint = None if restart else Checkpoint.load(path)
+
+    if checkpoint is not None and checkpoint.output_format != output_format:
+        raise ValueError(f"The unfinished export in {output} is in {checkpoint.output_format} format, "
+                         f"use --format {checkpoint.output_format} or --restart")
+
+    if checkpoint is not None and os.path.exists(output) and os.path.getsize(output) >= checkpoint.offset:
+        started = time.strftime('%Y-%m-%d %H:%M', time.localtime(checkpoint.created_at))
+        print(f"Resuming the export started {started}: {checkpoint.done} of {len(checkpoint.track_ids)} tracks done. "
+              f"Tracks liked since then are not included, use --restart for a fresh list", file=sys.stderr)
+        out = open(output, 'r+', encoding='utf-8', newline='')
+        out.seek(checkpoint.offset)
+        out.truncate()
+    else:
+        if checkpoint is not None:
+            print(f"{output} is missing or shorter than its checkpoint says, starting over", file=sys.stderr)
+        if cache and cache.offline:
+            raise ConnectionError("The list of liked tracks can only be fetched online")
+        checkpoint = Checkpoint(path, await fetch_liked_track_ids(fetcher), batch_size, output_format)
+        checkpoint.start()
+        out = open(output, 'w', encoding='utf-8', newline='')
+
+    writer = get_writer(output_format, 'track', out, fetcher.format_track_info)
+    if isinstance(writer, CsvWriter) and checkpoint.offset:
+        writer.header_written = True
+
+    resumed_at = position = checkpoint.done
+    exported = missing = 0
+    stopped = None
+    try:
+        if checkpoint.batch_size != batch_size:
+            print(f"Continuing with the batch size of the unfinished export ({checkpoint.batch_size})", file=sys.stderr)
+
+        remaining = checkpoint.track_ids[position:]
+        async for track_id, track_data, error in fetcher.fetch_tracks(remaining, checkpoint.batch_size):
+            position += 1
+            if error is None:
+                writer.write(track_data)
+                exported += 1
+            elif isinstance(error, (ConnectionError, CacheMiss, BatchError)):
+                # The batch as a whole failed (network, authorization, an unexpected answer) and is worth
+                # another try later, so it is not marked as done
+                stopped = stopped or error
+            else:
+                # This track alone is gone from the service or unreadable; trying again would not help,
+                # so the batch still counts as done
+                print(f"Error: {track_id}: {error}", file=sys.stderr, flush=True)
+                missing += 1
+
+            if (position - resumed_at) % checkpoint.batch_size == 0 or position == len(checkpoint.track_ids):
+                if stopped is not None:
+                    break
+                checkpoint.advance(position, out)
+                print(f"Exported {position} of {len(checkpoint.track_ids)} tracks", file=sys.stderr, flush=True)
+    finally:
+        writer.close()
+        out.close()
+        checkpoint.close()
+
+    if stopped is not None:
+        print(f"Error: {stopped}", file=sys.stderr)
+        print(f"Stopped after {checkpoint.done} of {len(checkpoint.track_ids)} tracks, run the same command again to resume",
+              file=sys.stderr)
+        return False
+
+    checkpoint.remove()
+    print(f"Done: {exported} tracks written to {output} in this run"
+          f"{f', {missing} skipped' if missing else ''}", file=sys.stderr)
+    return True
+
+
+def add_arguments(parser):
+    parser.add_argument('output', metavar='FILE', help="file to export to; progress is kept in FILE.checkpoint until the export is done")
+    parser.add_argument('--format', choices=FORMATS, default='ndjson', help="output format (default: ndjson)")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                        help=f"tracks requested per API call and per checkpoint (default: {DEFAULT_BATCH_SIZE})")
+    parser.add_argument('--restart', action='store_true', help="ignore an unfinished export and start over with a fresh list of likes")
+    add_cache_arguments(parser)
+    add_rate_arguments(parser)
+    add_profile_arguments(parser)
+
+
+def run_cli(args, parser):
+    enable_from_args(args)
+
+    if args.batch_size < 1:
+        parser.error("--batch-size must be a positive number")
+    if args.output == '-':
+        parser.error("the export needs a file to resume into, not stdout")
+
+    try:
+        cache = cache_from_args(args)
+        configure_from_args(args)
+    except ValueError as e:
+        parser.error(str(e))
+
+    try:
+        with priority(BULK):
+            if not session.run(export_likes(args.output, args.format, args.batch_size, cache, args.restart)):
+                sys.exit(1)
+    except (ValueError, ConnectionError, RuntimeError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    except KeyboardInterrupt:
+        print("\nInterrupted, run the same command again to resume", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        if cache:
+            cache.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    add_arguments(parser)
+    run_cli(parser.parse_args(), parser)
@@ -0,0 +1,224 @@
+import argparse
+import json
+import os
+import re
+import sys
+from collections import Counter
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+DESCRIPTION = "Extract and classify Yandex Music links from logs, chat exports and ID lists"
+
+KINDS = ('album', 'track', 'artist', 'playlist')
+
+# One pass of one pattern classifies a link. Every other shape, including hosts the service does not use, falls
+# through to the last branch, so each Yandex Music link in a line is either classified or reported as invalid
+LINK_PATTERN = re.compile(r'''
+    music\.yandex\.
+    (?:
+        (?:ru|com|by|kz)/
+        (?:
+            album/(?P<album>\d+)(?:/track/(?P<album_track>\d+))?(?![\w-])
+          | track/(?P<track>\d+)(?![\w-])
+          | artist/(?P<artist>\d+)(?![\w-])
+          | users/(?P<owner>[\w.-]+)/playlists/(?P<kind>\d+)(?![\w-])
+        )
+      | (?P<other>\S*)
+    )
+''', re.VERBOSE)
+
+# What each kind looks like when given as a bare ID rather than a link
+BARE_ID_PATTERNS = {
+    'album': re.compile(r'\d+'),
+    'track': re.compile(r'\d+(?::\d+)?'),
+    'artist': re.compile(r'\d+'),
+    'playlist': re.compile(r'[\w.-]+:\d+'),
+}
+
+
+def _classify(match: 're.Match') -> Optional[Tuple[str, str]]:
+    if match.group('album_track'):
+        return 'track', match.group('album_track')
+    for kind in ('album', 'track', 'artist'):
+        if match.group(kind):
+            return kind, match.group(kind)
+    if match.group('owner'):
+        return 'playlist', f"{match.group('owner')}:{match.group('kind')}"
+    return None
+
+
+def extract_id(value: str, kind: str) -> str:
+    # A bare ID or a link of the expected kind; anything else is rejected instead of being passed on as an "ID"
+    value = value.strip() if value else ''
+    if not value:
+        raise ValueError(f"{kind.capitalize()} ID or URL cannot be empty")
+
+    if BARE_ID_PATTERNS[kind].fullmatch(value):
+        return value
+
+    match = LINK_PATTERN.search(value)
+    if match:
+        found = _classify(match)
+        if found and found[0] == kind:
+            return found[1]
+        # A track link also names the album it is on
+        if kind == 'album' and match.group('album'):
+            return match.group('album')
+
+    raise ValueError(f"Invalid {kind} ID or URL: {value}")
+
+
+class IdSet:
+    # Numeric IDs as bits in 8 KiB chunks allocated on first use, so memory follows the span of IDs seen rather
+    # than their number: every track ID in use today fits in a few dozen megabytes at most
+    CHUNK_BITS = 1 << 16
+
+    def __init__(self):
+        self._chunks: Dict[int, bytearray] = {}
+        self._count = 0
+
+    def add(self, value: int) -> bool:
+        # Returns False if the ID was already there
+        chunk_index, offset = value >> 16, value & 0xFFFF
+        chunk = self._chunks.get(chunk_index)
+        if chunk is None:
+            chunk = self._chunks[chunk_index] = bytearray(self.CHUNK_BITS >> 3)
+
+        mask = 1 << (offset & 7)
+        if chunk[offset >> 3] & mask:
+            return False
+        chunk[offset >> 3] |= mask
+        self._count += 1
+        return True
+
+    def __contains__(self, value: int) -> bool:
+        chunk = self._chunks.get(value >> 16)
+        return chunk is not None and bool(chunk[(value & 0xFFFF) >> 3] & (1 << (value & 7)))
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._chunks) * (self.CHUNK_BITS >> 3)
+
+
+class LinkExtractor:
+    def __init__(self, bare_kind: Optional[str] = None, on_invalid: Optional[Callable[[int, str], None]] = None):
+        # bare_kind says what a line holding nothing but a bare ID is; without it such lines count as invalid
+        self.bare_kind = bare_kind
+        self.on_invalid = on_invalid
+        self.counts = Counter()
+        self._seen = {kind: IdSet() for kind in ('album', 'track', 'artist')}
+        # Playlists are owner:kind pairs rather than numbers, and rare enough for a plain set
+        self._seen_playlists = set()
+
+    def _first_time(self, kind: str, item_id: str) -> bool:
+        if kind == 'playlist':
+            if item_id in self._seen_playlists:
+                return False
+            self._seen_playlists.add(item_id)
+            return True
+        return self._seen[kind].add(int(item_id.split(':')[0]))
+
+    def extract(self, lines: Iterable[str]) -> Iterator[Tuple[str, str]]:
+        # Yields (kind, id) for every ID seen for the first time, in input order
+        for line_number, line in enumerate(lines, 1):
+            found = []
+            invalid = []
+            # A substring test is far cheaper than the regex, and most lines of a log hold no link at all
+            if 'music.yandex.' in line:
+                for match in LINK_PATTERN.finditer(line):
+                    item = _classify(match)
+                    if item is None:
+                        invalid.append(match.group(0))
+                    else:
+                        found.append(item)
+            elif self.bare_kind:
+                value = line.strip()
+                if not value or value.startswith('#'):
+                    continue
+                if BARE_ID_PATTERNS[self.bare_kind].fullmatch(value):
+                    found.append((self.bare_kind, value))
+                else:
+                    invalid.append(value)
+
+            for value in invalid:
+                self.counts['invalid'] += 1
+                if self.on_invalid:
+                    self.on_invalid(line_number, value)
+
+            for kind, item_id in found:
+                if self._first_time(kind, item_id):
+                    self.counts[kind] += 1
+                    yield kind, item_id
+                else:
+                    self.counts['duplicate'] += 1
+
+    def batches(self, lines: Iterable[str], batch_size: int = 100) -> Iterator[Tuple[str, List[str]]]:
+        # Typed batches ready for the fetchers: each kind is buffered separately and sent on once full
+        if batch_size < 1:
+            raise ValueError("Batch size must be a positive number")
+
+        pending: Dict[str, List[str]] = {kind: [] for kind in KINDS}
+        for kind, item_id in self.extract(lines):
+            batch = pending[kind]
+            batch.append(item_id)
+            if len(batch) >= batch_size:
+                yield kind, batch
+                pending[kind] = []
+
+        for kind in KINDS:
+            if pending[kind]:
+                yield kind, pending[kind]
+
+
+def _read_lines(paths: List[str]) -> Iterator[str]:
+    for path in paths:
+        if path == '-':
+            yield from sys.stdin
+        else:
+            with open(path, encoding='utf-8', errors='replace') as stream:
+                yield from stream
+
+
+def add_arguments(parser):
+    parser.add_argument('files', nargs='*', default=['-'], help="files to scan ('-' for stdin, the default)")
+    parser.add_argument('--bare', choices=KINDS, help="treat lines that hold only a bare ID as IDs of this kind")
+    parser.add_argument('--batch-size', type=int, default=100, help="IDs per output batch (default: 100)")
+    parser.add_argument('--split', metavar='DIR', help="write DIR/album.txt, DIR/track.txt and so on, one ID per line, "
+                                                      "ready for --batch of the other scripts, instead of NDJSON batches")
+    parser.add_argument('--quiet', action='store_true', help="count invalid inputs without printing each of them")
+
+
+def run_cli(args, parser):
+    def report_invalid(line_number: int, value: str):
+        if not args.quiet:
+            print(f"Invalid link on line {line_number}: {value}", file=sys.stderr)
+
+    extractor = LinkExtractor(args.bare, report_invalid)
+    outputs = {}
+    try:
+        if args.split:
+            os.makedirs(args.split, exist_ok=True)
+        for kind, batch in extractor.batches(_read_lines(args.files), args.batch_size):
+            if args.split:
+                if kind not in outputs:
+                    outputs[kind] = open(os.path.join(args.split, f"{kind}.txt"), 'w', encoding='utf-8')
+                outputs[kind].write('\n'.join(batch) + '\n')
+            else:
+                print(json.dumps({'kind': kind, 'ids': batch}, separators=(',', ':')))
+    except ValueError as e:
+        parser.error(str(e))
+    finally:
+        for stream in outputs.values():
+            stream.close()
+
+    counts = extractor.counts
+    print(', '.join(f"{counts[kind]} {kind}s" for kind in KINDS) +
+          f", {counts['duplicate']} duplicates, {counts['invalid']} invalid", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    add_arguments(parser)
+    run_cli(parser.parse_args(), parser)
@@ -0,0 +1,134 @@
+import asyncio
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+DEFAULT_MAX_SIZE = 256
+
+
+class Memo:
+    # Keys are (kind, id) pairs such as ('album', '123') or ('track', '456')
+    def __init__(self, maxsize: int = DEFAULT_MAX_SIZE):
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        # Track ID -> {album ID: track} for every album with tracks held in self._items
+        self._album_tracks: Dict[str, Dict[str, object]] = {}
+
+    def get(self, key):
+        value = self._items.get(key)
+        if value is not None:
+            self._items.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        if value is None:
+            return
+
+        self._items[key] = value
+        self._items.move_to_end(key)
+
+        kind, item_id = key
+        if kind == 'album':
+            for volume in getattr(value, 'volumes', None) or []:
+                for track in volume:
+                    self._album_tracks.setdefault(str(track.id), {})[item_id] = track
+
+        while len(self._items) > self.maxsize:
+            (kind, item_id), old = self._items.popitem(last=False)
+            if kind == 'album':
+                for volume in getattr(old, 'volumes', None) or []:
+                    for track in volume:
+                        albums = self._album_tracks.get(str(track.id))
+                        if albums is not None:
+                            albums.pop(item_id, None)
+                            if not albums:
+                                del self._album_tracks[str(track.id)]
+
+    def album_track(self, track_id: str, album_id: Optional[str] = None) -> Optional[Tuple[object, object]]:
+        # (track, album) when the album the track is wanted from is held, which is the track's first album
+        # unless album_id says otherwise; a compilation that also has the track must not answer for it
+        albums = self._album_tracks.get(track_id)
+        if not albums:
+            return None
+
+        if album_id is None:
+            track = next(iter(albums.values()))
+            main = getattr(track, 'albums', None)
+            if not main:
+                return None
+            album_id = str(main[0].id)
+
+        track = albums.get(album_id)
+        if track is None:
+            return None
+        return track, self.get(('album', album_id))
+
+    def any_album_track(self, track_id: str):
+        # The track from whichever held album has it, for callers that read nothing album-specific
+        albums = self._album_tracks.get(track_id)
+        return next(iter(albums.values())) if albums else None
+
+    def _track_task(self, key, task: asyncio.Future):
+        self._inflight[key] = task
+
+        def done(task):
+            if self._inflight.get(key) is task:
+                del self._inflight[key]
+            if not task.cancelled() and task.exception() is None:
+                self.put(key, task.result())
+
+        task.add_done_callback(done)
+
+    async def get_or_fetch(self, key, fetch: Callable[[], Awaitable]):
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        # Later callers asking for the same key while it is being fetched share the first request
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fetch())
+            self._track_task(key, task)
+
+        return await asyncio.shield(task)
+
+    async def get_or_fetch_many(self, keys: Iterable, fetch: Callable[[List], Awaitable[dict]]) -> dict:
+        found = {}
+        waiting = {}
+        missing = []
+        for key in keys:
+            value = self.get(key)
+            if value is not None:
+                found[key] = value
+            elif key in self._inflight:
+                waiting[key] = self._inflight[key]
+            else:
+                missing.append(key)
+
+        if missing:
+            # One request for everything nobody else is already fetching, split into per-key results
+            batch = asyncio.ensure_future(fetch(missing))
+            for key in missing:
+                task = asyncio.ensure_future(_pick(batch, key))
+                self._track_task(key, task)
+                waiting[key] = task
+
+        results = await asyncio.gather(*(asyncio.shield(task) for task in waiting.values()), return_exceptions=True)
+        for key, result in zip(waiting, results):
+            if isinstance(result, BaseException):
+                raise result
+            if result is not None:
+                found[key] = result
+
+        return found
+
+    def clear(self):
+        self._items.clear()
+        self._album_tracks.clear()
+
+
+async def _pick(batch: asyncio.Future, key) -> Optional[object]:
+    return (await asyncio.shield(batch)).get(key)
+
+
+shared = Memo()
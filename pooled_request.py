@@ -0,0 +1,68 @@
+import asyncio
+import time
+from http import HTTPStatus
+
+import aiohttp
+from yandex_music.exceptions import NetworkError, TimedOutError
+from yandex_music.utils.request_async import Request
+
+from profiling import endpoint_name, profiler
+from scheduler import retry_after, scheduler
+
+
+class PooledRequest(Request):
+    # The stock Request opens a new aiohttp session (and TLS connection) for every call,
+    # this one keeps a single session alive so connections are reused between lookups
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._session = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession()
+        return self._session
+
+    async def _request_wrapper(self, *args, **kwargs) -> bytes:
+        # Every attempt waits for the shared scheduler, and throttled or failed attempts are retried with backoff
+        kwargs = self._prepare_kwargs(kwargs)
+        name = endpoint_name(*args[:2])
+
+        attempt = 0
+        while True:
+            sent_at = await scheduler.acquire()
+            start = time.perf_counter()
+            status = headers = None
+            try:
+                try:
+                    async with self._get_session().request(*args, **kwargs) as resp:
+                        content = await resp.read()
+                    # Only set once the whole body arrived; a read cut short is a network error, not a response
+                    status, headers = resp.status, resp.headers
+                except asyncio.TimeoutError as e:
+                    raise TimedOutError from e
+                except aiohttp.ClientError as e:
+                    raise NetworkError(e) from e
+
+                if not HTTPStatus.OK <= resp.status < HTTPStatus.MULTIPLE_CHOICES:
+                    self._handle_error_response(resp.status, content)
+            except BaseException as e:
+                error = type(e).__name__ if status is None else f'HTTP {status}'
+                profiler.record(name, time.perf_counter() - start, error=error)
+                if not isinstance(e, Exception):
+                    raise
+                retryable = scheduler.feedback(status, sent_at, retry_after(headers))
+                if not retryable or attempt >= scheduler.retries:
+                    raise
+                profiler.record('scheduler.retry', error=error)
+                await asyncio.sleep(scheduler.backoff(attempt))
+                attempt += 1
+                continue
+
+            scheduler.feedback(status, sent_at)
+            profiler.record(name, time.perf_counter() - start, len(content))
+            return content
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
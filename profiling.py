@@ -0,0 +1,149 @@
+import atexit
+import functools
+import json
+import math
+import re
+import sys
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+# Latencies go into logarithmic buckets 5% apart starting at 10 µs, so memory stays fixed however many calls are made
+_BUCKET_BASE = 1e-5
+_BUCKET_GROWTH = math.log(1.05)
+_BUCKETS = 400
+
+
+class Stat:
+    __slots__ = ('count', 'total', 'max', 'bytes', 'errors', 'buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.bytes = 0
+        self.errors = Counter()
+        self.buckets = [0] * _BUCKETS
+
+    def add(self, seconds: float, nbytes: int = 0, error: Optional[str] = None):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.bytes += nbytes
+        if error:
+            self.errors[error] += 1
+        index = 0 if seconds <= _BUCKET_BASE else int(math.log(seconds / _BUCKET_BASE) / _BUCKET_GROWTH) + 1
+        self.buckets[min(index, _BUCKETS - 1)] += 1
+
+    def percentile(self, pct: float) -> float:
+        rank = math.ceil(self.count * pct / 100)
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= rank:
+                # Upper edge of the bucket, capped by the slowest call actually seen
+                return min(_BUCKET_BASE * math.exp(index * _BUCKET_GROWTH), self.max)
+        return self.max
+
+    def to_dict(self) -> dict:
+        return {
+            'count': self.count,
+            'total_ms': self.total * 1000,
+            'mean_ms': self.total / self.count * 1000 if self.count else 0.0,
+            'p50_ms': self.percentile(50) * 1000,
+            'p95_ms': self.percentile(95) * 1000,
+            'p99_ms': self.percentile(99) * 1000,
+            'max_ms': self.max * 1000,
+            'bytes': self.bytes,
+            'errors': dict(self.errors),
+        }
+
+
+class Profiler:
+    def __init__(self):
+        self.enabled = False
+        self.stats: Dict[str, Stat] = {}
+        self.started = time.perf_counter()
+
+    def record(self, name: str, seconds: float = 0.0, nbytes: int = 0, error: Optional[str] = None):
+        if not self.enabled:
+            return
+        stat = self.stats.get(name)
+        if stat is None:
+            stat = self.stats[name] = Stat()
+        stat.add(seconds, nbytes, error)
+
+    @contextmanager
+    def measure(self, name: str):
+        if not self.enabled:
+            yield
+            return
+
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException as e:
+            # Recorded before the scripts turn everything into ConnectionError/RuntimeError
+            self.record(name, time.perf_counter() - start, error=type(e).__name__)
+            raise
+        self.record(name, time.perf_counter() - start)
+
+    def timed(self, name: str):
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.measure(name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def to_dict(self) -> dict:
+        return {
+            'wall_ms': (time.perf_counter() - self.started) * 1000,
+            'stats': {name: stat.to_dict() for name, stat in sorted(self.stats.items())},
+        }
+
+    def summary(self) -> str:
+        output = [f"{'name':<40}{'count':>8}{'total ms':>11}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}{'KiB':>9}  errors"]
+        for name, stat in sorted(self.stats.items(), key=lambda item: -item[1].total):
+            errors = ', '.join(f"{error}={count}" for error, count in stat.errors.most_common())
+            output.append(
+                f"{name:<40}{stat.count:>8}{stat.total * 1000:>11.1f}{stat.percentile(50) * 1000:>9.1f}"
+                f"{stat.percentile(95) * 1000:>9.1f}{stat.percentile(99) * 1000:>9.1f}{stat.max * 1000:>9.1f}"
+                f"{stat.bytes / 1024:>9.1f}  {errors}"
+            )
+        output.append(f"Wall time: {(time.perf_counter() - self.started) * 1000:.1f} ms")
+        return '\n'.join(output)
+
+
+profiler = Profiler()
+
+
+def endpoint_name(method: str, url: str) -> str:
+    # IDs are folded so all album lookups, for example, land in one "GET /albums/{id}/with-tracks" bucket
+    return f"api {method} {re.sub(r'/[0-9][^/]*', '/{id}', urlparse(url).path)}"
+
+
+def add_profile_arguments(parser):
+    group = parser.add_argument_group('profiling')
+    group.add_argument('--profile', action='store_true', help="print per-call latency, byte and error statistics at exit")
+    group.add_argument('--profile-json', metavar='FILE', help="write the same statistics as JSON to FILE at exit")
+
+
+def enable_from_args(args):
+    if not (args.profile or args.profile_json):
+        return
+
+    profiler.enabled = True
+    profiler.started = time.perf_counter()
+
+    def report():
+        if args.profile:
+            print("\n" + profiler.summary(), file=sys.stderr)
+        if args.profile_json:
+            with open(args.profile_json, 'w', encoding='utf-8') as stream:
+                json.dump(profiler.to_dict(), stream, indent=2)
+
+    atexit.register(report)
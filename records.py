@@ -0,0 +1,141 @@
+import sys
+from typing import Optional, Tuple
+
+
+def _intern(value: Optional[str]) -> Optional[str]:
+    # Artist names, labels and regions repeat across thousands of records, so keep one copy of each
+    return sys.intern(value) if value else value
+
+
+class TracklistEntry:
+    __slots__ = ('id', 'title', 'version', 'artists', 'duration_ms')
+
+    def __init__(self, id: str, title: str, version: Optional[str], artists: str, duration_ms: int):
+        self.id = id
+        self.title = title
+        self.version = version
+        self.artists = _intern(artists)
+        self.duration_ms = duration_ms or 0
+
+    @classmethod
+    def from_track(cls, track) -> 'TracklistEntry':
+        return cls(
+            str(track.id),
+            track.title,
+            track.version,
+            ', '.join([artist.name for artist in track.artists]),
+            track.duration_ms,
+        )
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'TracklistEntry':
+        return cls(data['id'], data.get('title'), data.get('version'), data.get('artists'), data.get('duration_ms'))
+
+    def to_dict(self, volume: int) -> dict:
+        return {
+            'id': self.id,
+            'volume': volume,
+            'title': self.title,
+            'version': self.version,
+            'artists': self.artists,
+            'duration_ms': self.duration_ms,
+        }
+
+
+class AlbumRecord:
+    __slots__ = ('id', 'title', 'version', 'year', 'label', 'major', 'release_date', 'artists', 'available_countries', 'volumes')
+
+    def __init__(self, id: str, title: str, version: Optional[str], year, label: str, major: str, release_date: str,
+                 artists: str, available_countries, volumes: Tuple[Tuple[TracklistEntry, ...], ...] = ()):
+        self.id = id
+        self.title = title
+        self.version = version
+        self.year = year
+        self.label = _intern(label)
+        self.major = _intern(major)
+        self.release_date = release_date
+        self.artists = _intern(artists)
+        self.available_countries = tuple(_intern(region) for region in available_countries or ())
+        self.volumes = volumes
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'AlbumRecord':
+        volumes = []
+        for entry in data.get('tracks') or ():
+            while len(volumes) < entry.get('volume', 1):
+                volumes.append([])
+            volumes[entry.get('volume', 1) - 1].append(TracklistEntry.from_dict(entry))
+
+        fields = {name: data.get(name) for name in cls.__slots__ if name != 'volumes'}
+        return cls(**fields, volumes=tuple(tuple(volume) for volume in volumes))
+
+    @property
+    def track_count(self) -> int:
+        return sum(len(volume) for volume in self.volumes)
+
+    def to_dict(self) -> dict:
+        tracks = [entry.to_dict(volume_idx + 1) for volume_idx, volume in enumerate(self.volumes) for entry in volume]
+        return {
+            'id': self.id,
+            'title': self.title,
+            'version': self.version,
+            'year': self.year,
+            'label': self.label,
+            'major': self.major,
+            'release_date': self.release_date,
+            'artists': self.artists,
+            'available_countries': list(self.available_countries),
+            'tracks': tracks,
+            'track_count': len(tracks),
+        }
+
+
+class TrackRecord:
+    __slots__ = ('id', 'title', 'version', 'year', 'label', 'major', 'release_date', 'artists', 'duration_ms',
+                 'available_countries', 'content_warning', 'type', 'track_sharing_flag', 'track_source')
+
+    def __init__(self, id: str, title: str, version: Optional[str], year, label: str, major: str, release_date: str,
+                 artists: str, duration_ms: int, available_countries, content_warning, type, track_sharing_flag, track_source):
+        self.id = id
+        self.title = title
+        self.version = version
+        self.year = year
+        self.label = _intern(label)
+        self.major = _intern(major)
+        self.release_date = release_date
+        self.artists = _intern(artists)
+        self.duration_ms = duration_ms or 0
+        self.available_countries = tuple(_intern(region) for region in available_countries or ())
+        self.content_warning = content_warning
+        self.type = type
+        self.track_sharing_flag = track_sharing_flag
+        self.track_source = track_source
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'TrackRecord':
+        return cls(**{name: data.get(name) for name in cls.__slots__})
+
+    def to_dict(self) -> dict:
+        data = {name: getattr(self, name) for name in self.__slots__}
+        data['available_countries'] = list(self.available_countries)
+        return data
+
+
+class VideoRecord:
+    __slots__ = ('track_id', 'title', 'artist', 'cover_uri', 'embed_url', 'provider_video_id')
+
+    def __init__(self, track_id: str, title: str, artist: str, cover_uri: Optional[str], embed_url: str,
+                 provider_video_id: Optional[str] = None):
+        self.track_id = track_id
+        self.title = title
+        self.artist = _intern(artist)
+        self.cover_uri = cover_uri
+        self.embed_url = embed_url
+        self.provider_video_id = provider_video_id
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'VideoRecord':
+        return cls(**{name: data.get(name) for name in cls.__slots__})
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
@@ -0,0 +1,300 @@
+import argparse
+import json
+import mmap
+import os
+import re
+import sys
+from array import array
+from collections import defaultdict
+from itertools import compress
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from cache import DATA_DIR, DEFAULT_CACHE_PATH, MetadataCache
+from profiling import add_profile_arguments, enable_from_args, profiler
+
+DESCRIPTION = "Index fetched albums and tracks by region and query availability without re-fetching"
+
+DEFAULT_INDEX_DIR = os.path.join(DATA_DIR, 'regions')
+
+KINDS = ('album', 'track')
+
+# Regions are ISO codes; anything else is skipped rather than turned into a file name
+REGION_PATTERN = re.compile(r'[A-Za-z0-9]{1,8}')
+
+# Bitmaps are converted to and from one byte per slot via base-2 strings, which int() and format() handle in C
+_TO_DIGITS = bytes.maketrans(b'\x00\x01', b'01')
+_TO_FLAGS = bytes.maketrans(b'01', b'\x00\x01')
+
+
+def _entry(record) -> Optional[Tuple[int, Tuple[str, ...]]]:
+    # Accepts AlbumRecord/TrackRecord objects as well as their dicts from the cache or NDJSON output
+    if isinstance(record, dict):
+        item_id, regions = record.get('id'), record.get('available_countries')
+    else:
+        item_id, regions = record.id, record.available_countries
+
+    item_id = str(item_id or '').split(':')[0]
+    if not item_id.isdigit():
+        return None
+    if isinstance(regions, str):
+        regions = regions.split()
+    return int(item_id), tuple(sorted({region for region in regions or () if REGION_PATTERN.fullmatch(region)}))
+
+
+def _bitmap(flags: bytes) -> int:
+    # One byte per slot, 0 or 1, to an int with bit N set for slot N
+    return int(flags.translate(_TO_DIGITS)[::-1] or b'0', 2)
+
+
+def _flags(bitmap: int) -> bytes:
+    return format(bitmap, 'b').encode()[::-1].translate(_TO_FLAGS)
+
+
+class RegionIndex:
+    # Every indexed ID gets a slot, in the order it was first seen, in ids.u64 (raw native uint64), and each region
+    # is a bitmap over those slots in REGION.bits. 200k releases take 25 KB per region, and set operations across
+    # regions are big-int &, | and ~ on memory-mapped files. New IDs only ever append, so existing bitmaps stay valid
+    def __init__(self, path: str = DEFAULT_INDEX_DIR, kind: str = 'album'):
+        if kind not in KINDS:
+            raise ValueError(f"Unknown kind: {kind}")
+
+        self.path = os.path.join(path, kind)
+        self.kind = kind
+        self._maps: Dict[str, mmap.mmap] = {}
+        self._ids: Optional[memoryview] = None
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _map(self, name: str):
+        if name not in self._maps:
+            try:
+                with open(self._file(name), 'rb') as stream:
+                    if os.fstat(stream.fileno()).st_size == 0:
+                        return b''
+                    self._maps[name] = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+            except FileNotFoundError:
+                return b''
+        return self._maps[name]
+
+    def ids(self) -> Sequence[int]:
+        # Every indexed ID, in slot order
+        if self._ids is None:
+            mapped = self._map('ids.u64')
+            if not mapped:
+                return ()
+            self._ids = memoryview(mapped).cast('Q')
+        return self._ids
+
+    def __len__(self) -> int:
+        return len(self.ids())
+
+    def regions(self) -> List[str]:
+        if not os.path.isdir(self.path):
+            return []
+        return sorted(name[:-5] for name in os.listdir(self.path) if name.endswith('.bits'))
+
+    def bitmap(self, region: str) -> int:
+        # An unknown region is simply empty
+        return int.from_bytes(self._map(f"{region}.bits"), 'little')
+
+    def mask(self, ids: Iterable[int]) -> int:
+        wanted = set(ids)
+        return _bitmap(bytes(map(wanted.__contains__, self.ids())))
+
+    def update(self, records: Iterable) -> int:
+        # Later records for the same ID win, and an ID leaves every region its new record no longer lists
+        entries = {}
+        for record in records:
+            entry = _entry(record)
+            if entry is not None:
+                entries[entry[0]] = entry[1]
+        if not entries:
+            return 0
+
+        with profiler.measure(f'regions.update.{self.kind}'):
+            old_ids = self.ids()
+            slots = dict(zip(old_ids, range(len(old_ids))))
+            new_ids = [item_id for item_id in entries if item_id not in slots]
+            slots.update(zip(new_ids, range(len(old_ids), len(old_ids) + len(new_ids))))
+            size = len(slots)
+
+            updated = bytearray(size)
+            in_region = defaultdict(lambda: bytearray(size))
+            for item_id, regions in entries.items():
+                slot = slots[item_id]
+                updated[slot] = 1
+                for region in regions:
+                    in_region[region][slot] = 1
+            updated = _bitmap(updated)
+
+            os.makedirs(self.path, exist_ok=True)
+            for region in set(self.regions()) | set(in_region):
+                old = self.bitmap(region)
+                # Regions none of the updated IDs were or are in stay untouched, so small updates rewrite little
+                if region not in in_region and not old & updated:
+                    continue
+                bitmap = old & ~updated | _bitmap(in_region.get(region, b''))
+                self._write(f"{region}.bits", bitmap.to_bytes((size + 7) // 8, 'little'))
+
+            # Written last: until then the new slots are outside every query, however far the bitmaps got
+            if new_ids:
+                self._write('ids.u64', bytes(old_ids) + array('Q', new_ids).tobytes())
+        return len(entries)
+
+    def _write(self, name: str, data: bytes):
+        self._release(name)
+        path = self._file(name)
+        with open(path + '.tmp', 'wb') as stream:
+            stream.write(data)
+        os.replace(path + '.tmp', path)
+
+    def select(self, all_of: Sequence[str] = (), any_of: Sequence[str] = (), none_of: Sequence[str] = (),
+               within: Optional[int] = None) -> int:
+        # The bitmap of slots matching every condition; within is a mask() limiting the answer to some IDs
+        with profiler.measure(f'regions.select.{self.kind}'):
+            result = (1 << len(self)) - 1
+            if within is not None:
+                result &= within
+            for region in all_of:
+                result &= self.bitmap(region)
+            if any_of:
+                matched = 0
+                for region in any_of:
+                    matched |= self.bitmap(region)
+                result &= matched
+            for region in none_of:
+                result &= ~self.bitmap(region)
+            return result
+
+    def resolve(self, bitmap: int) -> List[int]:
+        # Slots back to sorted IDs
+        return sorted(compress(self.ids(), _flags(bitmap)))
+
+    def counts(self) -> List[Tuple[str, int]]:
+        return sorted(((region, self.bitmap(region).bit_count()) for region in self.regions()),
+                      key=lambda item: (-item[1], item[0]))
+
+    def _release(self, name: str):
+        if name == 'ids.u64' and self._ids is not None:
+            self._ids.release()
+            self._ids = None
+        if name in self._maps:
+            self._maps.pop(name).close()
+
+    def close(self):
+        for name in list(self._maps):
+            self._release(name)
+
+
+def read_records(lines: Iterable[str]) -> Iterable[dict]:
+    for line_no, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            print(f"Skipping invalid record on line {line_no}: {e}", file=sys.stderr)
+
+
+def read_id_file(path: str) -> List[int]:
+    stream = sys.stdin if path == '-' else open(path, encoding='utf-8')
+    try:
+        ids = []
+        for line in stream:
+            value = line.strip().split(':')[0]
+            if value.isdigit():
+                ids.append(int(value))
+            elif value:
+                print(f"Skipping invalid ID: {value}", file=sys.stderr)
+        return ids
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+
+def _region_list(values: Optional[List[str]]) -> List[str]:
+    # "--not-in KZ,UZ" and "--not-in KZ --not-in UZ" mean the same
+    return [region.strip() for value in values or () for region in value.split(',') if region.strip()]
+
+
+def add_arguments(parser):
+    parser.add_argument('--index', default=DEFAULT_INDEX_DIR, metavar='DIR', help=f"index location (default: {DEFAULT_INDEX_DIR})")
+    commands = parser.add_subparsers(dest='regions_command', metavar='ACTION', required=True)
+
+    summary = "add albums or tracks to the index from NDJSON output or the metadata cache"
+    command = commands.add_parser('build', help=summary, description=summary)
+    command.add_argument('kind', choices=KINDS)
+    command.add_argument('files', nargs='*', help="NDJSON files written with --format ndjson by albums.py or tracks.py ('-' for stdin)")
+    command.add_argument('--from-cache', action='store_true', help="also index every record in the metadata cache")
+    command.add_argument('--cache-path', default=DEFAULT_CACHE_PATH, help=f"cache database location (default: {DEFAULT_CACHE_PATH})")
+    add_profile_arguments(command)
+
+    summary = "list regions with the number of releases available in each"
+    command = commands.add_parser('list', help=summary, description=summary)
+    command.add_argument('kind', choices=KINDS)
+
+    summary = "print the IDs matching a combination of regions"
+    command = commands.add_parser('query', help=summary, description=summary)
+    command.add_argument('kind', choices=KINDS)
+    command.add_argument('--in', dest='all_of', action='append', metavar='REGIONS', help="available in all of these regions")
+    command.add_argument('--any-in', dest='any_of', action='append', metavar='REGIONS', help="available in at least one of these regions")
+    command.add_argument('--not-in', dest='none_of', action='append', metavar='REGIONS', help="available in none of these regions")
+    command.add_argument('--ids', metavar='FILE', help="only consider the IDs listed in FILE ('-' for stdin)")
+    command.add_argument('--count', action='store_true', help="print only the number of matching IDs")
+    add_profile_arguments(command)
+
+
+def run_cli(args, parser):
+    index = RegionIndex(args.index, args.kind)
+    try:
+        if args.regions_command == 'build':
+            if not args.files and not args.from_cache:
+                parser.error("nothing to index: give NDJSON files or --from-cache")
+            enable_from_args(args)
+
+            before = len(index)
+            total = 0
+            if args.from_cache:
+                cache = MetadataCache(args.cache_path, mode='offline')
+                try:
+                    total += index.update(record for _, record in cache.items(args.kind))
+                finally:
+                    cache.close()
+            for path in args.files:
+                if path == '-':
+                    total += index.update(read_records(sys.stdin))
+                else:
+                    with open(path, encoding='utf-8') as stream:
+                        total += index.update(read_records(stream))
+            print(f"Indexed {total} {args.kind}s ({len(index) - before} new), {len(index)} in total", file=sys.stderr)
+        elif args.regions_command == 'list':
+            print(f"{len(index):>10}  total")
+            for region, count in index.counts():
+                print(f"{count:>10}  {region}")
+        else:
+            enable_from_args(args)
+            within = None
+            if args.ids:
+                ids = read_id_file(args.ids)
+                within = index.mask(ids)
+                unknown = len(set(ids)) - within.bit_count()
+                if unknown:
+                    print(f"{unknown} of the given IDs are not in the index", file=sys.stderr)
+
+            result = index.select(_region_list(args.all_of), _region_list(args.any_of), _region_list(args.none_of), within)
+            if args.count:
+                print(result.bit_count())
+            else:
+                sys.stdout.write(''.join(f"{item_id}\n" for item_id in index.resolve(result)))
+    except KeyboardInterrupt:
+        print("\nOperation cancelled by user", file=sys.stderr)
+    finally:
+        index.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    add_arguments(parser)
+    run_cli(parser.parse_args(), parser)
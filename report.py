@@ -0,0 +1,135 @@
+import argparse
+import json
+import sys
+from array import array
+from collections import Counter
+from typing import Dict, Iterable, List, Tuple
+
+from distributors import distributor_name
+
+DESCRIPTION = "Count releases per distributor, label, year and region"
+
+GROUPS = ('distributor', 'label', 'year', 'region')
+
+
+class Interner:
+    # Maps each distinct string to a small integer code, so a column is an array of codes
+    def __init__(self):
+        self.codes: Dict[str, int] = {}
+        self.values: List[str] = []
+
+    def code(self, value: str) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self.codes[value] = code
+            self.values.append(value)
+        return code
+
+
+class ReleaseColumns:
+    def __init__(self):
+        self.distributors = Interner()
+        self.labels = Interner()
+        self.regions = Interner()
+        self.distributor_codes = array('I')
+        self.label_codes = array('I')
+        self.years = array('H')
+        # Regions are multi-valued, so they are stored flat with the number of regions per release alongside
+        self.region_codes = array('I')
+        self.region_counts = array('H')
+
+    def __len__(self) -> int:
+        return len(self.label_codes)
+
+    def add(self, record: dict):
+        # Every field is checked before any column grows, so a bad record cannot leave the columns misaligned
+        major = record.get('major') or 'Unknown'
+        label = record.get('label') or 'N/A'
+        regions = record.get('available_countries') or []
+        if isinstance(regions, str):
+            regions = regions.split()
+        if not isinstance(major, str) or not isinstance(label, str):
+            raise TypeError("major and label must be strings")
+        if not isinstance(regions, list) or not all(isinstance(region, str) for region in regions):
+            raise TypeError("available_countries must be a list of region codes")
+        if len(regions) > 0xFFFF:
+            raise ValueError("too many regions")
+
+        year = record.get('year')
+        distributor = distributor_name(major)
+
+        self.distributor_codes.append(self.distributors.code(distributor))
+        self.label_codes.append(self.labels.code(label))
+        self.years.append(year if isinstance(year, int) and 0 < year < 65536 else 0)
+        self.region_codes.extend(self.regions.code(region) for region in regions)
+        self.region_counts.append(len(regions))
+
+    def counts(self, group: str) -> List[Tuple[str, int]]:
+        # Counter over a typed array runs the whole column through C in one pass
+        if group == 'distributor':
+            counts, values = Counter(self.distributor_codes), self.distributors.values
+        elif group == 'label':
+            counts, values = Counter(self.label_codes), self.labels.values
+        elif group == 'region':
+            counts, values = Counter(self.region_codes), self.regions.values
+        elif group == 'year':
+            return [(str(year) if year else 'Unknown', count) for year, count in Counter(self.years).most_common()]
+        else:
+            raise ValueError(f"Unknown group: {group}")
+
+        return [(values[code], count) for code, count in counts.most_common()]
+
+
+def load_releases(lines: Iterable[str], columns: ReleaseColumns) -> ReleaseColumns:
+    for line_no, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            columns.add(json.loads(line))
+        except (ValueError, TypeError, AttributeError) as e:
+            print(f"Skipping invalid record on line {line_no}: {e}", file=sys.stderr)
+    return columns
+
+
+def format_report(columns: ReleaseColumns, groups: Iterable[str], top: int) -> str:
+    output = [f"Releases: {len(columns)}"]
+    for group in groups:
+        output.append(f"\nReleases per {group}:")
+        rows = columns.counts(group)
+        for name, count in rows[:top] if top else rows:
+            output.append(f"{count:>10}  {name}")
+        if top and len(rows) > top:
+            output.append(f"{'':>10}  ... {len(rows) - top} more")
+    return '\n'.join(output)
+
+
+def add_arguments(parser):
+    parser.add_argument('files', nargs='*', default=['-'],
+                        help="NDJSON files written with --format ndjson by albums.py, tracks.py or artists.py ('-' for stdin)")
+    parser.add_argument('--group', action='append', choices=GROUPS, help="group to report (can be repeated, default: all)")
+    parser.add_argument('--top', type=int, default=20, help="show only the N largest groups, 0 for all (default: 20)")
+    parser.add_argument('--json', action='store_true', help="print the counts as JSON")
+
+
+def run_cli(args, parser):
+    columns = ReleaseColumns()
+    for path in args.files:
+        if path == '-':
+            load_releases(sys.stdin, columns)
+        else:
+            with open(path, encoding='utf-8') as stream:
+                load_releases(stream, columns)
+
+    groups = args.group or GROUPS
+    if args.json:
+        print(json.dumps({group: dict(columns.counts(group)) for group in groups}, ensure_ascii=False, indent=2))
+    else:
+        print(format_report(columns, groups, args.top))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    add_arguments(parser)
+    run_cli(parser.parse_args(), parser)
@@ -0,0 +1,181 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Mapping, Optional, Tuple
+
+from profiling import profiler
+
+INTERACTIVE = 0
+BULK = 1
+
+PRIORITY_NAMES = {INTERACTIVE: 'interactive', BULK: 'bulk'}
+
+# Responses that mean "slow down" rather than "this request is wrong"
+THROTTLE_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+DEFAULT_RATE = 10.0
+DEFAULT_MAX_RATE = 50.0
+DEFAULT_RETRIES = 4
+
+# Never slower than this, so a bad minute does not stall a long batch job for good
+MIN_RATE = 0.5
+
+# Additive increase is spread over successes, adding about one request per second for every second of
+# full-speed traffic; multiplicative decrease cuts the rate by this factor on throttling
+RATE_INCREASE = 1.0
+RATE_DECREASE = 0.5
+
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 30.0
+MAX_RETRY_AFTER = 300.0
+
+_priority = contextvars.ContextVar('priority', default=INTERACTIVE)
+
+
+def current_priority() -> int:
+    return _priority.get()
+
+
+@contextmanager
+def priority(level: int):
+    # Applies to requests made inside, including from tasks started inside; BULK queues behind INTERACTIVE
+    reset = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(reset)
+
+
+def retry_after(headers: Optional[Mapping[str, str]]) -> Optional[float]:
+    # Only the delay-seconds form; the service has not been seen sending an HTTP date here
+    try:
+        seconds = float((headers or {}).get('Retry-After', ''))
+    except ValueError:
+        return None
+    return min(seconds, MAX_RETRY_AFTER) if seconds > 0 else None
+
+
+class Scheduler:
+    # A token bucket shared by every API call in the process. The rate follows AIMD: it creeps up while
+    # responses are fine and halves on 429/5xx, so batch jobs settle just under the service's real limit.
+    # Waiters are served strictly by priority, then in arrival order
+    def __init__(self, rate: float = DEFAULT_RATE, max_rate: float = DEFAULT_MAX_RATE, retries: int = DEFAULT_RETRIES):
+        self._lock = threading.Lock()
+        self._waiting: List[Tuple[int, int]] = []
+        self._tickets = itertools.count()
+        self.configure(rate, max_rate, retries)
+
+    def configure(self, rate: float, max_rate: float, retries: int):
+        with self._lock:
+            self.rate = max(rate, MIN_RATE)
+            self.max_rate = max(max_rate, self.rate)
+            self.retries = retries
+            self._tokens = self._capacity
+            self._updated = time.monotonic()
+            self._paused_until = 0.0
+            self._decreased_at = 0.0
+
+    @property
+    def _capacity(self) -> float:
+        # Bursts of up to a second's worth of requests
+        return max(1.0, self.rate)
+
+    def _refill(self, now: float):
+        self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _try_acquire(self, ticket: Tuple[int, int]) -> Optional[float]:
+        # None once the ticket got its token, otherwise how long to sleep before asking again
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if now < self._paused_until:
+                return self._paused_until - now
+            if self._waiting[0] == ticket:
+                if self._tokens >= 1:
+                    heapq.heappop(self._waiting)
+                    self._tokens -= 1
+                    return None
+                return (1 - self._tokens) / self.rate
+            # Only the first in line can take the next token, the others look again one token later
+            return max(1 - self._tokens, 1) / self.rate
+
+    def _enqueue(self, priority: Optional[int]) -> Tuple[int, int]:
+        ticket = (current_priority() if priority is None else priority, next(self._tickets))
+        with self._lock:
+            heapq.heappush(self._waiting, ticket)
+        return ticket
+
+    def _dequeue(self, ticket: Tuple[int, int]):
+        with self._lock:
+            if ticket in self._waiting:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+
+    def _record_wait(self, ticket: Tuple[int, int], start: float):
+        profiler.record(f'scheduler.wait.{PRIORITY_NAMES.get(ticket[0], ticket[0])}', time.perf_counter() - start)
+
+    async def acquire(self, priority: Optional[int] = None) -> float:
+        # Returns the monotonic send time to hand back to feedback()
+        ticket = self._enqueue(priority)
+        start = time.perf_counter()
+        try:
+            while True:
+                delay = self._try_acquire(ticket)
+                if delay is None:
+                    break
+                await asyncio.sleep(delay)
+        except BaseException:
+            self._dequeue(ticket)
+            raise
+        self._record_wait(ticket, start)
+        return time.monotonic()
+
+    def feedback(self, status: Optional[int], sent_at: float, retry_after: Optional[float] = None) -> bool:
+        # Reports how a request sent at sent_at went and returns whether it is worth retrying. Everything sent
+        # before the last decrease was sent at the old rate, so a burst of 429s from it only halves the rate once
+        with self._lock:
+            if status in THROTTLE_STATUSES:
+                now = time.monotonic()
+                if sent_at >= self._decreased_at:
+                    self.rate = max(MIN_RATE, self.rate * RATE_DECREASE)
+                    self._tokens = min(self._tokens, self._capacity)
+                    self._decreased_at = now
+                    profiler.record('scheduler.throttled', error=f'HTTP {status}')
+                if retry_after:
+                    self._paused_until = max(self._paused_until, now + retry_after)
+                return True
+            if status is not None and status < 400:
+                self.rate = min(self.max_rate, self.rate + RATE_INCREASE / self.rate)
+            # Network errors and timeouts say nothing about the rate but are worth another try
+            return status is None
+
+    def backoff(self, attempt: int) -> float:
+        # Full jitter: requests throttled together do not all come back together
+        return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+
+
+scheduler = Scheduler()
+
+
+def add_rate_arguments(parser):
+    group = parser.add_argument_group('rate limit')
+    group.add_argument('--rate', type=float, default=DEFAULT_RATE, metavar='N',
+                       help=f"API requests per second to start from; adjusted to throttling as the run goes (default: {DEFAULT_RATE:g})")
+    group.add_argument('--max-rate', type=float, default=DEFAULT_MAX_RATE, metavar='N',
+                       help=f"never go above N API requests per second (default: {DEFAULT_MAX_RATE:g})")
+    group.add_argument('--retries', type=int, default=DEFAULT_RETRIES, metavar='N',
+                       help=f"retry throttled or failed API requests up to N times (default: {DEFAULT_RETRIES})")
+
+
+def configure_from_args(args):
+    if args.rate <= 0 or args.max_rate <= 0:
+        raise ValueError("Rate must be a positive number")
+    if args.retries < 0:
+        raise ValueError("Retries must not be negative")
+    scheduler.configure(args.rate, args.max_rate, args.retries)
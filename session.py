@@ -0,0 +1,115 @@
+import asyncio
+import sys
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+
+from profiling import profiler
+
+# yandex_music and aiohttp take a few hundred milliseconds to import, so they are only
+# loaded once a script actually talks to the network; --help, ID parsing and cache hits never do
+if TYPE_CHECKING:
+    import aiohttp
+    from yandex_music import ClientAsync
+
+
+class _NeverRaised(Exception):
+    pass
+
+
+def network_error() -> type:
+    # Used as `except session.network_error()`, which is only evaluated once something was raised.
+    # Nothing can have raised the library's NetworkError before the library was imported
+    module = sys.modules.get('yandex_music.exceptions')
+    return module.NetworkError if module is not None else _NeverRaised
+
+
+def not_found_error() -> type:
+    # A NetworkError too, so it has to be caught first
+    module = sys.modules.get('yandex_music.exceptions')
+    return module.NotFoundError if module is not None else _NeverRaised
+
+
+# Points every client at another API server, e.g. the local stand-in used by benchmark.py
+api_base_url: Optional[str] = None
+
+_clients: Dict[Tuple[str, Optional[str]], 'ClientAsync'] = {}
+_client_lock: Optional[asyncio.Lock] = None
+_http_session: Optional['aiohttp.ClientSession'] = None
+_download_session: Optional['aiohttp.ClientSession'] = None
+
+
+async def get_client(token: str, base_url: Optional[str] = None) -> 'ClientAsync':
+    global _client_lock
+
+    base_url = base_url or api_base_url
+    key = (token, base_url)
+    if key in _clients:
+        return _clients[key]
+
+    if _client_lock is None:
+        _client_lock = asyncio.Lock()
+
+    # Concurrent first callers wait here so client.init() only runs once per process
+    async with _client_lock:
+        if key not in _clients:
+            with profiler.measure('client.import'):
+                from yandex_music import ClientAsync
+                from pooled_request import PooledRequest
+
+            request = PooledRequest()
+            client = ClientAsync(token, base_url=base_url, request=request)
+            try:
+                with profiler.measure('client.init'):
+                    await client.init()
+            except BaseException:
+                await request.close()
+                raise
+            _clients[key] = client
+
+    return _clients[key]
+
+
+def get_http_session() -> 'aiohttp.ClientSession':
+    # For API calls made without the library client, such as top.py's endpoint probes; callers set their own deadlines
+    global _http_session
+
+    if _http_session is None or _http_session.closed:
+        import aiohttp
+        _http_session = aiohttp.ClientSession()
+    return _http_session
+
+
+def get_download_session() -> 'aiohttp.ClientSession':
+    # Media files live on other hosts than the API, so they get their own pool without API headers
+    global _download_session
+
+    if _download_session is None or _download_session.closed:
+        import aiohttp
+        _download_session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=None, sock_connect=30, sock_read=60))
+    return _download_session
+
+
+async def close():
+    global _client_lock, _http_session, _download_session
+
+    while _clients:
+        _, client = _clients.popitem()
+        await client.request.close()
+    _client_lock = None
+
+    if _http_session is not None:
+        await _http_session.close()
+        _http_session = None
+
+    if _download_session is not None:
+        await _download_session.close()
+        _download_session = None
+
+
+def run(main):
+    async def runner():
+        try:
+            return await main
+        finally:
+            await close()
+
+    return asyncio.run(runner())
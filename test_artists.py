@@ -0,0 +1,15 @@
+import asyncio
+
+from yandex_music.exceptions import UnauthorizedError
+
+import artists
+import session
+
+
+def test_library_errors_are_reported_not_raised(monkeypatch, capsys):
+    async def get_client(token, base_url=None):
+        raise UnauthorizedError('Unauthorized')
+
+    monkeypatch.setattr(session, 'get_client', get_client)
+    asyncio.run(artists.main('1', 1, False, 10))
+    assert capsys.readouterr().err.strip() == "Error: Failed to fetch discography: Unauthorized"
@@ -0,0 +1,111 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import cache
+from cache import CacheMiss, MetadataCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache, 'time', SimpleNamespace(time=clock.time, perf_counter=time.perf_counter))
+    return clock
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'cache.sqlite3')
+
+
+def open_cache(path, **kwargs):
+    return MetadataCache(path, ttl={'album': 60}, **kwargs)
+
+
+def test_entries_go_stale_after_their_ttl(clock, path):
+    metadata_cache = open_cache(path)
+    metadata_cache.put('album', '1', {'title': "Album"})
+
+    clock.now += 60
+    assert metadata_cache.get('album', '1') == {'title': "Album"}
+    clock.now += 1
+    assert metadata_cache.get('album', '1') is None
+    metadata_cache.close()
+
+
+def test_offline_reads_stale_entries_and_writes_nothing(clock, path):
+    metadata_cache = open_cache(path)
+    metadata_cache.put('album', '1', {'title': "Album"})
+    metadata_cache.close()
+
+    clock.now += 3600
+    metadata_cache = open_cache(path, mode='offline')
+    assert metadata_cache.offline
+    assert metadata_cache.get('album', '1') == {'title': "Album"}
+    metadata_cache.put('album', '2', {'title': "Other"})
+    assert metadata_cache.get('album', '2') is None
+    metadata_cache.close()
+
+
+def test_refresh_ignores_entries_but_stores_new_ones(clock, path):
+    metadata_cache = open_cache(path)
+    metadata_cache.put('album', '1', {'title': "Old"})
+    metadata_cache.close()
+
+    metadata_cache = open_cache(path, mode='refresh')
+    assert metadata_cache.get('album', '1') is None
+    metadata_cache.put('album', '1', {'title': "New"})
+    metadata_cache.close()
+
+    metadata_cache = open_cache(path)
+    assert metadata_cache.get('album', '1') == {'title': "New"}
+    metadata_cache.close()
+
+
+def test_bypass_neither_reads_nor_writes(clock, path):
+    metadata_cache = open_cache(path)
+    metadata_cache.put('album', '1', {'title': "Album"})
+    metadata_cache.close()
+
+    metadata_cache = open_cache(path, mode='bypass')
+    assert metadata_cache.get('album', '1') is None
+    metadata_cache.put('album', '2', {'title': "Other"})
+    assert list(metadata_cache.items('album')) == []
+    metadata_cache.close()
+
+    metadata_cache = open_cache(path)
+    assert metadata_cache.get('album', '2') is None
+    metadata_cache.close()
+
+
+def test_least_recently_used_entries_are_evicted(clock, path):
+    # Each entry is 108 bytes, so the fourth one goes over the limit
+    metadata_cache = open_cache(path, max_size=350)
+    for key in ('a', 'b', 'c'):
+        clock.now += 1
+        metadata_cache.put('album', key, {'n': 'x' * 100})
+    clock.now += 1
+    assert metadata_cache.get('album', 'a') is not None
+
+    clock.now += 1
+    metadata_cache.put('album', 'd', {'n': 'x' * 100})
+    assert sorted(key for key, _ in metadata_cache.items('album')) == ['a', 'd']
+    metadata_cache.close()
+
+
+def test_unknown_mode_is_rejected(path):
+    with pytest.raises(ValueError):
+        MetadataCache(path, mode='sometimes')
+
+
+def test_cache_miss_is_a_lookup_error():
+    assert issubclass(CacheMiss, LookupError)
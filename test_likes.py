@@ -0,0 +1,83 @@
+import asyncio
+import json
+import os
+from types import SimpleNamespace
+
+import pytest
+from yandex_music.exceptions import UnauthorizedError
+
+import likes
+import session
+import tracks
+from memo import Memo
+from test_tracks import make_album, make_track
+
+
+class FakeClient:
+    def __init__(self, count):
+        album = make_album(10, 2001, "Label", ['RU'])
+        self.liked = [f'{track_id}:10' for track_id in range(1, count + 1)]
+        self.tracks_by_id = {str(track_id): make_track(track_id, [album]) for track_id in range(1, count + 1)}
+        self.fail_on = None
+        self.calls = 0
+
+    async def users_likes_tracks(self):
+        return SimpleNamespace(tracks=[SimpleNamespace(track_id=track_id) for track_id in self.liked])
+
+    async def tracks(self, track_ids):
+        self.calls += 1
+        if self.calls == self.fail_on:
+            raise UnauthorizedError('Unauthorized')
+        return [self.tracks_by_id[key] for key in (track_id.split(':')[0] for track_id in track_ids) if key in self.tracks_by_id]
+
+
+@pytest.fixture
+def client(monkeypatch):
+    client = FakeClient(5)
+
+    async def get_client(token, base_url=None):
+        return client
+
+    monkeypatch.setattr(session, 'get_client', get_client)
+    return client
+
+
+def export(output, monkeypatch):
+    # Every run starts with nothing in memory, like a new process would
+    monkeypatch.setattr(tracks, 'shared_memo', Memo())
+    return asyncio.run(likes.export_likes(output, batch_size=2))
+
+
+def exported_ids(path):
+    with open(path, encoding='utf-8') as stream:
+        return [json.loads(line)['id'] for line in stream]
+
+
+def test_unauthorized_batch_stops_and_resumes(client, tmp_path, monkeypatch):
+    output = str(tmp_path / 'likes.ndjson')
+
+    client.fail_on = 2
+    assert export(output, monkeypatch) is False
+    assert exported_ids(output) == ['1', '2']
+    assert likes.Checkpoint.load(likes.checkpoint_path(output)).done == 2
+
+    assert export(output, monkeypatch) is True
+    assert exported_ids(output) == ['1', '2', '3', '4', '5']
+    assert not os.path.exists(likes.checkpoint_path(output))
+
+
+def test_missing_tracks_are_skipped(client, tmp_path, monkeypatch):
+    output = str(tmp_path / 'likes.ndjson')
+    del client.tracks_by_id['3']
+
+    assert export(output, monkeypatch) is True
+    assert exported_ids(output) == ['1', '2', '4', '5']
+
+
+def test_unauthorized_listing_is_a_runtime_error(client, tmp_path, monkeypatch):
+    async def users_likes_tracks():
+        raise UnauthorizedError('Unauthorized')
+
+    client.users_likes_tracks = users_likes_tracks
+    with pytest.raises(RuntimeError, match="Unauthorized"):
+        export(str(tmp_path / 'likes.ndjson'), monkeypatch)
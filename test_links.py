@@ -0,0 +1,62 @@
+import pytest
+
+from links import IdSet, LinkExtractor, extract_id
+
+
+@pytest.mark.parametrize('value, kind, expected', [
+    ('123', 'album', '123'),
+    (' 123:456 ', 'track', '123:456'),
+    ('https://music.yandex.ru/album/1/track/2', 'track', '2'),
+    ('https://music.yandex.ru/album/1/track/2', 'album', '1'),
+    ('music.yandex.com/artist/7?from=search', 'artist', '7'),
+    ('https://music.yandex.by/users/some.one/playlists/3', 'playlist', 'some.one:3'),
+])
+def test_extract_id(value, kind, expected):
+    assert extract_id(value, kind) == expected
+
+
+@pytest.mark.parametrize('value, kind', [
+    ('', 'album'),
+    ('abc', 'album'),
+    ('123:456', 'album'),
+    ('https://music.yandex.ru/album/1', 'track'),
+    ('https://music.yandex.ru/album/12abc', 'album'),
+    ('https://music.yandex.ua/album/1/track/2', 'track'),
+    ('https://example.com/album/1', 'album'),
+])
+def test_extract_id_rejects_invalid_input(value, kind):
+    with pytest.raises(ValueError):
+        extract_id(value, kind)
+
+
+def test_extractor_classifies_dedupes_and_reports():
+    invalid = []
+    extractor = LinkExtractor(on_invalid=lambda line_number, value: invalid.append((line_number, value)))
+    lines = [
+        "see https://music.yandex.ru/album/1/track/2 and music.yandex.ru/artist/3\n",
+        "no links here\n",
+        "again https://music.yandex.com/track/2 https://music.yandex.ru/users/me/playlists/5\n",
+        "https://music.yandex.ua/album/1/track/2\n",
+        "just music.yandex.ru\n",
+        "https://music.yandex.ru/radio\n",
+    ]
+
+    assert list(extractor.extract(lines)) == [('track', '2'), ('artist', '3'), ('playlist', 'me:5')]
+    assert invalid == [(4, 'music.yandex.ua/album/1/track/2'), (5, 'music.yandex.ru'), (6, 'music.yandex.ru/radio')]
+    assert extractor.counts == {'track': 1, 'artist': 1, 'playlist': 1, 'duplicate': 1, 'invalid': 3}
+
+
+def test_extractor_bare_ids_and_batches():
+    invalid = []
+    extractor = LinkExtractor('track', lambda line_number, value: invalid.append(value))
+    lines = ["# comment\n", "1\n", "2:20\n", "1\n", "x1\n", "\n", "3\n"]
+
+    assert list(extractor.batches(lines, batch_size=2)) == [('track', ['1', '2:20']), ('track', ['3'])]
+    assert invalid == ['x1']
+
+
+def test_id_set():
+    ids = IdSet()
+    assert ids.add(5) and ids.add(1 << 40) and not ids.add(5)
+    assert 5 in ids and 6 not in ids and (1 << 40) in ids
+    assert len(ids) == 2
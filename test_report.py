@@ -0,0 +1,24 @@
+import json
+
+from report import ReleaseColumns, load_releases
+
+
+def test_invalid_records_are_skipped_without_misaligning_columns(capsys):
+    lines = [
+        json.dumps({'major': 'Sony', 'label': 'Columbia', 'year': 2001, 'available_countries': ['RU', 'KZ']}),
+        json.dumps({'major': 'Sony', 'label': ['Columbia'], 'year': 2002}),
+        json.dumps({'major': 'Warner', 'label': 'Atlantic', 'available_countries': 5}),
+        json.dumps({'major': 'Warner', 'label': 'Atlantic', 'available_countries': ['RU', 7]}),
+        json.dumps([1, 2]),
+        'not json',
+        json.dumps({'major': 'Warner', 'label': 'Atlantic', 'year': 2003, 'available_countries': 'RU BY'}),
+    ]
+
+    columns = load_releases(lines, ReleaseColumns())
+
+    assert len(columns) == 2
+    assert len(columns.distributor_codes) == len(columns.years) == len(columns.region_counts) == 2
+    assert dict(columns.counts('label')) == {'Columbia': 1, 'Atlantic': 1}
+    assert dict(columns.counts('year')) == {'2001': 1, '2003': 1}
+    assert dict(columns.counts('region')) == {'RU': 2, 'KZ': 1, 'BY': 1}
+    assert capsys.readouterr().err.count("Skipping invalid record") == 5
@@ -0,0 +1,143 @@
+import asyncio
+import http.server
+import threading
+import time
+
+import pytest
+from yandex_music.exceptions import NetworkError, NotFoundError
+
+import pooled_request
+from pooled_request import PooledRequest
+from scheduler import BULK, INTERACTIVE, MIN_RATE, Scheduler
+
+
+def test_a_round_of_throttled_requests_halves_the_rate_once():
+    scheduler = Scheduler(rate=16, max_rate=16)
+    sent_at = time.monotonic()
+    for _ in range(5):
+        assert scheduler.feedback(429, sent_at) is True
+    assert scheduler.rate == 8
+
+    # Sent after the decrease, so it is news about the new rate
+    assert scheduler.feedback(503, time.monotonic()) is True
+    assert scheduler.rate == 4
+
+    for _ in range(10):
+        scheduler.feedback(429, time.monotonic())
+    assert scheduler.rate == MIN_RATE
+
+
+def test_successes_raise_the_rate_up_to_the_limit():
+    scheduler = Scheduler(rate=1, max_rate=2)
+    for _ in range(10):
+        assert scheduler.feedback(200, time.monotonic()) is False
+    assert scheduler.rate == 2
+
+
+@pytest.mark.parametrize('status', [400, 401, 403, 404])
+def test_client_errors_are_not_retried(status):
+    scheduler = Scheduler(rate=10)
+    assert scheduler.feedback(status, time.monotonic()) is False
+    assert scheduler.rate == 10
+
+
+@pytest.mark.parametrize('status', [None, 429, 500, 502, 503, 504])
+def test_throttling_and_network_errors_are_retried(status):
+    assert Scheduler(rate=10).feedback(status, time.monotonic()) is True
+
+
+def test_retry_after_pauses_everyone():
+    async def main():
+        scheduler = Scheduler(rate=100)
+        scheduler.feedback(429, time.monotonic(), retry_after=0.3)
+        start = time.monotonic()
+        await scheduler.acquire()
+        return time.monotonic() - start
+
+    assert asyncio.run(main()) >= 0.3
+
+
+def test_interactive_requests_are_served_before_bulk():
+    async def main():
+        scheduler = Scheduler(rate=20)
+        # Use up the burst so everyone below has to queue
+        for _ in range(20):
+            await scheduler.acquire()
+
+        served = []
+
+        async def request(name, level):
+            await scheduler.acquire(level)
+            served.append(name)
+
+        await asyncio.gather(request('bulk 1', BULK), request('bulk 2', BULK),
+                             request('interactive 1', INTERACTIVE), request('interactive 2', INTERACTIVE))
+        return served
+
+    assert asyncio.run(main()) == ['interactive 1', 'interactive 2', 'bulk 1', 'bulk 2']
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    statuses = []
+    hits = 0
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        Handler.hits += 1
+        status = Handler.statuses.pop(0) if Handler.statuses else 200
+        body = b'{"result": "ok"}' if status == 200 else b''
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def url(monkeypatch):
+    # A fast scheduler of its own, so the shared one keeps its settings and the retries do not sleep
+    scheduler = Scheduler(rate=1000, max_rate=1000, retries=2)
+    monkeypatch.setattr(scheduler, 'backoff', lambda attempt: 0)
+    monkeypatch.setattr(pooled_request, 'scheduler', scheduler)
+    monkeypatch.setattr(Handler, 'hits', 0)
+    monkeypatch.setattr(Handler, 'statuses', [])
+
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_port}/tracks'
+    server.shutdown()
+    server.server_close()
+
+
+def get(url):
+    async def main():
+        request = PooledRequest()
+        try:
+            return await request._request_wrapper('GET', url, timeout=5)
+        finally:
+            await request.close()
+
+    return asyncio.run(main())
+
+
+def test_throttled_request_is_retried_until_it_succeeds(url):
+    Handler.statuses = [429, 503]
+    assert get(url) == b'{"result": "ok"}'
+    assert Handler.hits == 3
+
+
+def test_retries_give_up_after_the_limit(url):
+    Handler.statuses = [503] * 5
+    with pytest.raises(NetworkError):
+        get(url)
+    assert Handler.hits == 3
+
+
+def test_client_error_is_raised_without_a_retry(url):
+    Handler.statuses = [404]
+    with pytest.raises(NotFoundError):
+        get(url)
+    assert Handler.hits == 1
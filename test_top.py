@@ -0,0 +1,79 @@
+import http.server
+import json
+import threading
+import time
+
+import pytest
+
+import top
+
+HANG = 5
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    answering = '/users/me/top/artists'
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        try:
+            if self.path == self.answering:
+                body = json.dumps({'result': [{'name': 'Artist'}]}).encode()
+                self.send_response(200)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                return
+
+            # A byte at a time, so no single read ever times out
+            self.send_response(200)
+            self.send_header('Content-Length', str(HANG * 10))
+            self.end_headers()
+            for _ in range(HANG * 10):
+                time.sleep(0.1)
+                self.wfile.write(b' ')
+                self.wfile.flush()
+        except OSError:
+            pass
+
+
+@pytest.fixture
+def base_url():
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_port}'
+    server.shutdown()
+    server.server_close()
+
+
+def test_race_does_not_wait_for_the_losers(base_url, tmp_path):
+    before = set(threading.enumerate())
+    start = time.perf_counter()
+    data = top.get_top_artists('YOUR_TOKEN', base_url, timeout=HANG * 2, endpoint_cache=str(tmp_path / 'endpoint.json'))
+    assert data == {'result': [{'name': 'Artist'}]}
+    assert time.perf_counter() - start < HANG / 2
+
+    # Nothing is left running on behalf of the lookup, only the server's own handlers
+    left = [thread for thread in set(threading.enumerate()) - before if 'process_request' not in thread.name]
+    assert left == []
+
+
+def test_hanging_endpoints_time_out(base_url, monkeypatch):
+    monkeypatch.setattr(Handler, 'answering', None)
+    start = time.perf_counter()
+    assert top.get_top_artists('YOUR_TOKEN', base_url, timeout=0.5, endpoint_cache=None) is None
+    assert time.perf_counter() - start < HANG / 2
+
+
+def test_hanging_saved_endpoint_is_replaced(base_url, tmp_path):
+    endpoint_cache = str(tmp_path / 'endpoint.json')
+    top.save_endpoint(endpoint_cache, base_url, base_url + '/personal/top/artists', ('result',))
+
+    start = time.perf_counter()
+    data = top.get_top_artists('YOUR_TOKEN', base_url, timeout=0.5, endpoint_cache=endpoint_cache)
+    assert data == {'result': [{'name': 'Artist'}]}
+    assert time.perf_counter() - start < HANG / 2
+    assert top.load_endpoint(endpoint_cache, base_url)['url'] == base_url + Handler.answering
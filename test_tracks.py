@@ -0,0 +1,99 @@
+import asyncio
+from types import SimpleNamespace
+
+from cache import MetadataCache
+from memo import Memo
+from tracks import YandexMusicTrackFetcher
+
+
+def make_album(album_id, year, label, regions, tracks=()):
+    return SimpleNamespace(id=album_id, title=f"Album {album_id}", version=None, year=year,
+                           labels=[SimpleNamespace(name=label)], major=None, release_date=None,
+                           regions=regions, volumes=[list(tracks)] if tracks else [])
+
+
+def make_track(track_id, albums):
+    return SimpleNamespace(id=track_id, title=f"Track {track_id}", version=None, albums=albums, major=None,
+                           artists=[SimpleNamespace(name="Artist")], duration_ms=180000)
+
+
+class FakeClient:
+    def __init__(self, tracks):
+        self._tracks = {str(track.id): track for track in tracks}
+        self.requested = []
+
+    async def tracks(self, track_ids):
+        self.requested.append(list(track_ids))
+        return [self._tracks[track_id.split(':')[0]] for track_id in track_ids if track_id.split(':')[0] in self._tracks]
+
+
+def make_fetcher(client, memo):
+    fetcher = YandexMusicTrackFetcher("YOUR_TOKEN", memo=memo)
+    fetcher.client = client
+    return fetcher
+
+
+def test_compilation_in_memo_does_not_answer_for_the_track():
+    own = make_album(9999, 2001, "Own Label", ['RU'])
+    track = make_track(100000, [own])
+    compilation = make_album(1000, 2020, "Compilation Label", ['KZ'], [make_track(100000, [own])])
+
+    memo = Memo()
+    memo.put(('album', '1000'), compilation)
+    client = FakeClient([track])
+    fetcher = make_fetcher(client, memo)
+
+    for track_id in ('100000', '100000:9999'):
+        record = asyncio.run(fetcher.fetch_track(track_id))
+        assert (record.label, record.year, record.available_countries) == ("Own Label", 2001, ('RU',))
+    assert client.requested
+
+
+def test_own_album_in_memo_answers_without_a_request():
+    own = make_album(9999, 2001, "Own Label", ['RU'])
+    own.volumes = [[make_track(100000, [own])]]
+
+    memo = Memo()
+    memo.put(('album', '9999'), own)
+    client = FakeClient([])
+    fetcher = make_fetcher(client, memo)
+
+    record = asyncio.run(fetcher.fetch_track('100000'))
+    assert (record.label, record.year) == ("Own Label", 2001)
+    record = asyncio.run(fetcher.fetch_track('100000:9999'))
+    assert (record.label, record.year) == ("Own Label", 2001)
+    assert client.requested == []
+
+
+def test_requested_album_is_used_from_memo():
+    own = make_album(9999, 2001, "Own Label", ['RU'])
+    compilation = make_album(1000, 2020, "Compilation Label", ['KZ'], [make_track(100000, [own])])
+
+    memo = Memo()
+    memo.put(('album', '1000'), compilation)
+    fetcher = make_fetcher(FakeClient([]), memo)
+
+    record = asyncio.run(fetcher.fetch_track('100000:1000'))
+    assert (record.label, record.year) == ("Compilation Label", 2020)
+
+
+async def collect(fetcher, track_ids):
+    return {track_id: (record, error) async for track_id, record, error in fetcher.fetch_tracks(track_ids)}
+
+
+def test_batch_answers_pairs_with_the_album_asked_for(tmp_path):
+    own = make_album(9999, 2001, "Own Label", ['RU'])
+    compilation = make_album(1000, 2020, "Compilation Label", ['KZ'])
+    track = make_track(100000, [own, compilation])
+
+    cache = MetadataCache(str(tmp_path / 'cache.sqlite3'))
+    for memo in (Memo(), Memo()):
+        # The second pass finds both records in the cache
+        fetcher = YandexMusicTrackFetcher("YOUR_TOKEN", cache, memo)
+        fetcher.client = FakeClient([track])
+        results = asyncio.run(collect(fetcher, ['100000', '100000:1000', '100000:9999']))
+        assert {track_id: record.label for track_id, (record, _) in results.items()} == {
+            '100000': "Own Label", '100000:1000': "Compilation Label", '100000:9999': "Own Label",
+        }
+    assert fetcher.client.requested == []
+    cache.close()
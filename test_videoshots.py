@@ -0,0 +1,44 @@
+import asyncio
+
+import videoshots
+from records import VideoRecord
+
+TRACKS = 50
+CONCURRENCY = 3
+
+
+def test_scan_keeps_at_most_concurrency_downloads(monkeypatch, tmp_path):
+    pending = set()
+    most = 0
+
+    async def scan_videos(self, track_ids, batch_size=100):
+        for track_id in range(TRACKS):
+            yield str(track_id), [VideoRecord(str(track_id), "Title", "Artist", None, f'https://video.example/{track_id}.mp4')], None
+
+    async def download_video(http, url, path, chunk_size=64 * 1024):
+        nonlocal most
+        pending.add(url)
+        most = max(most, len(pending))
+        await asyncio.sleep(0.001)
+        pending.discard(url)
+        return 1
+
+    monkeypatch.setattr(videoshots.YandexMusicTrackFetcher, 'scan_videos', scan_videos)
+    monkeypatch.setattr(videoshots, 'download_video', download_video)
+    created = []
+    ensure_future = asyncio.ensure_future
+
+    def counting_ensure_future(coro, **kwargs):
+        # Every download task that exists and has not finished is held in memory, running or not
+        task = ensure_future(coro, **kwargs)
+        if getattr(coro, '__name__', None) == 'download':
+            created.append(task)
+            assert sum(not task.done() for task in created) <= CONCURRENCY
+        return task
+
+    monkeypatch.setattr(videoshots.asyncio, 'ensure_future', counting_ensure_future)
+
+    videoshots.session.run(videoshots.scan_main(None, [], [], output=str(tmp_path / 'videos.txt'),
+                                                download_dir=str(tmp_path), download_concurrency=CONCURRENCY))
+    assert len(created) == TRACKS
+    assert most <= CONCURRENCY
@@ -0,0 +1,108 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import session
+import watch
+from test_tracks import make_album, make_track
+
+
+class FakeClient:
+    def __init__(self):
+        self.albums = {}
+        self.tracks_by_id = {}
+        self.requested_tracks = []
+
+    async def albums_with_tracks(self, album_id):
+        return self.albums.get(str(album_id))
+
+    async def tracks(self, track_ids):
+        self.requested_tracks.extend(track_ids)
+        return [self.tracks_by_id[track_id] for track_id in track_ids if track_id in self.tracks_by_id]
+
+
+class ListWriter:
+    def __init__(self):
+        self.changes = []
+
+    def write(self, change):
+        self.changes.append(change)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    client = FakeClient()
+
+    async def get_client(token, base_url=None):
+        return client
+
+    monkeypatch.setattr(session, 'get_client', get_client)
+    return client
+
+
+@pytest.fixture
+def watchlist(tmp_path):
+    watchlist = watch.Watchlist(str(tmp_path / 'watch.sqlite3'))
+    yield watchlist
+    watchlist.close()
+
+
+def sync(watchlist):
+    writer = ListWriter()
+    stats = asyncio.run(watch.sync(watchlist, writer))
+    return writer.changes, stats
+
+
+def add_release(client, album_id, track_id, label):
+    album = make_album(album_id, 2001, label, ['RU'])
+    track = make_track(track_id, [album])
+    track.major = SimpleNamespace(name='Sony')
+    album.volumes = [[track]]
+    client.albums[str(album_id)] = album
+    client.tracks_by_id[str(track_id)] = track
+    return album, track
+
+
+def test_tracks_are_fetched_on_their_own(client, watchlist):
+    own, _ = add_release(client, 9999, 100000, "Own Label")
+    compilation = make_album(1000, 2020, "Compilation Label", ['KZ'], [make_track(100000, [own])])
+    client.albums['1000'] = compilation
+    watchlist.add('album', ['1000', '9999'])
+    watchlist.add('track', ['100000'])
+
+    sync(watchlist)
+    changes, stats = sync(watchlist)
+
+    # Both albums holding the track were fetched first, the track still comes from tracks()
+    assert client.requested_tracks == ['100000', '100000']
+    assert changes == [] and stats['unchanged'] == 3
+
+
+def test_disappearing_entries_are_reported_once(client, watchlist):
+    add_release(client, 9999, 100000, "Own Label")
+    watchlist.add('album', ['9999'])
+    watchlist.add('track', ['100000'])
+    sync(watchlist)
+
+    album, track = client.albums.pop('9999'), client.tracks_by_id.pop('100000')
+    changes, stats = sync(watchlist)
+    assert [(change.kind, change.id, change.changes) for change in changes] == [
+        ('album', '9999', {'status': {'old': 'available', 'new': 'removed'}}),
+        ('track', '100000', {'status': {'old': 'available', 'new': 'removed'}}),
+    ]
+    assert stats['removed'] == 2 and stats['failed'] == 0
+
+    changes, stats = sync(watchlist)
+    assert changes == [] and stats['unchanged'] == 2
+
+    client.albums['9999'], client.tracks_by_id['100000'] = album, track
+    changes, stats = sync(watchlist)
+    assert [change.changes for change in changes] == [{'status': {'old': 'removed', 'new': 'available'}}] * 2
+
+
+def test_unknown_ids_keep_failing(client, watchlist):
+    watchlist.add('track', ['555'])
+    for _ in range(2):
+        changes, stats = sync(watchlist)
+        assert changes == [] and stats['failed'] == 1
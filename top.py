@@ -1,67 +1,191 @@
-import requests
+import argparse
+import asyncio
+import os
+import time
+
 import json
 
-def get_top_artists():
-    # Try multiple possible endpoints
-    endpoints = [
-        'https://api.music.yandex.net/personal/top/artists/month',
-        'https://api.music.yandex.net/personal/top/artists',
-        'https://api.music.yandex.net/users/me/top/artists'
-    ]
-    
-    # Prompt user for their OAuth token
-    token = input("Please enter your OAuth token: ")
-    
+import session
+from cache import CACHE_DIR
+from profiling import add_profile_arguments, enable_from_args, endpoint_name, profiler
+from scheduler import add_rate_arguments, configure_from_args, retry_after, scheduler
+
+DESCRIPTION = "Show your top artists on Yandex Music"
+
+API_BASE_URL = 'https://api.music.yandex.net'
+
+# Candidate endpoints, only one of them answers for a given account
+TOP_ENDPOINTS = (
+    '/personal/top/artists/month',
+    '/personal/top/artists',
+    '/users/me/top/artists',
+)
+
+# Where the artist list sits in the different response structures, in the order they are checked
+RESPONSE_SHAPES = (
+    ('result',),
+    ('result', 'artists'),
+    ('result', 'items'),
+    ('artists',),
+    ('data',),
+    (),
+)
+
+DEFAULT_TIMEOUT = 10
+
+ENDPOINT_CACHE_PATH = os.path.join(CACHE_DIR, 'top-endpoint.json')
+
+def find_artists(data, shape=None):
+    # Returns the shape that matched and the artist list it points to, or None
+    for path in ([tuple(shape)] if shape is not None else RESPONSE_SHAPES):
+        value = data
+        for key in path:
+            value = value.get(key) if isinstance(value, dict) else None
+        if isinstance(value, list) and value:
+            return path, value
+    return None
+
+def read_endpoints(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            known = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return known if isinstance(known, dict) else {}
+
+def write_endpoints(path, known):
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Written next to the real file and renamed, so a crash never leaves half a file behind
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(known, f, indent=2)
+        os.replace(path + '.tmp', path)
+    except OSError:
+        pass
+
+def load_endpoint(path, base_url):
+    if not path:
+        return None
+    known = read_endpoints(path).get(base_url)
+    return known if isinstance(known, dict) and 'url' in known else None
+
+def save_endpoint(path, base_url, url, shape):
+    if not path:
+        return
+    known = read_endpoints(path)
+    known[base_url] = {'url': url, 'shape': list(shape)}
+    write_endpoints(path, known)
+
+def forget_endpoint(path, base_url):
+    if not path:
+        return
+    known = read_endpoints(path)
+    if known.pop(base_url, None) is not None:
+        write_endpoints(path, known)
+
+async def probe(http, url, headers, timeout=DEFAULT_TIMEOUT, shape=None):
+    # Every endpoint gets its own deadline, retries included, so one that hangs costs at most timeout seconds
+    try:
+        return await asyncio.wait_for(_probe(http, url, headers, shape), timeout)
+    except asyncio.TimeoutError:
+        profiler.record(endpoint_name('GET', url), timeout, error='TimeoutError')
+        return None
+
+async def _probe(http, url, headers, shape=None):
+    # Already loaded by session.get_http_session(), aiohttp is only imported once a lookup starts
+    import aiohttp
+
+    name = endpoint_name('GET', url)
+    attempt = 0
+    while True:
+        sent_at = await scheduler.acquire()
+        start = time.perf_counter()
+        try:
+            async with http.get(url, headers=headers) as response:
+                status, headers_received, body = response.status, response.headers, await response.read()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            profiler.record(name, time.perf_counter() - start, error=type(e).__name__)
+            return None
+
+        profiler.record(name, time.perf_counter() - start, len(body), None if status == 200 else f'HTTP {status}')
+        if status == 200:
+            scheduler.feedback(status, sent_at)
+            break
+
+        # Throttled probes are tried again, any other failure means this endpoint is not the one
+        if not scheduler.feedback(status, sent_at, retry_after(headers_received)) or attempt >= scheduler.retries:
+            return None
+        await asyncio.sleep(scheduler.backoff(attempt))
+        attempt += 1
+
+    try:
+        # Parse JSON response and check if we got actual data
+        data = json.loads(body)
+    except ValueError:
+        return None
+    found = find_artists(data, shape)
+    return (data, found[0]) if found else None
+
+async def race(http, urls, headers, timeout=DEFAULT_TIMEOUT):
+    # Every candidate is asked at once and the first usable answer wins; the others are cancelled,
+    # which closes their connections instead of leaving them to run on
+    tasks = {asyncio.ensure_future(probe(http, url, headers, timeout)): url for url in urls}
+    pending = set(tasks)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                result = task.result()
+                if result is not None:
+                    return tasks[task], result[0], result[1]
+        return None
+    finally:
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+async def lookup_top_artists(token, base_url=API_BASE_URL, timeout=DEFAULT_TIMEOUT, endpoint_cache=ENDPOINT_CACHE_PATH):
     # Set up headers with user's token
     headers = {
         'Authorization': f'OAuth {token}',
         'Content-Type': 'application/json',
         'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
     }
-    
-    for url in endpoints:
-        try:
-            response = requests.get(url, headers=headers)
-            
-            # Check if request was successful
-            if response.status_code == 200:
-                # Parse JSON response
-                data = response.json()
-                
-                # Check if we got actual data
-                if data and (data.get('result') or data.get('artists') or data.get('data')):
-                    return data
-                else:
-                    continue
-            else:
-                continue
-                
-        except requests.exceptions.RequestException as e:
-            continue
-    
-    return None
 
-def main():
+    http = session.get_http_session()
+
+    # The endpoint that worked last time is tried alone; if it fails or hangs it is forgotten and all are probed again
+    known = load_endpoint(endpoint_cache, base_url)
+    if known:
+        result = await probe(http, known['url'], headers, timeout, known.get('shape'))
+        if result is not None:
+            return result[0]
+        forget_endpoint(endpoint_cache, base_url)
+
+    winner = await race(http, [base_url + endpoint for endpoint in TOP_ENDPOINTS], headers, timeout)
+    if winner is None:
+        return None
+
+    url, data, shape = winner
+    save_endpoint(endpoint_cache, base_url, url, shape)
+    return data
+
+def get_top_artists(token=None, base_url=API_BASE_URL, timeout=DEFAULT_TIMEOUT, endpoint_cache=ENDPOINT_CACHE_PATH):
+    # Prompt user for their OAuth token
+    if token is None:
+        token = input("Please enter your OAuth token: ")
+
+    return session.run(lookup_top_artists(token, base_url, timeout, endpoint_cache))
+
+def main(timeout=DEFAULT_TIMEOUT):
     # Get top artists
-    top_artists = get_top_artists()
+    top_artists = get_top_artists(timeout=timeout)
     
     # Process the response
     if top_artists:
         # Try different possible response structures
-        artists_data = None
-        if 'result' in top_artists:
-            if isinstance(top_artists['result'], list):
-                artists_data = top_artists['result']
-            elif 'artists' in top_artists['result']:
-                artists_data = top_artists['result']['artists']
-            elif 'items' in top_artists['result']:
-                artists_data = top_artists['result']['items']
-        elif 'artists' in top_artists:
-            artists_data = top_artists['artists']
-        elif 'data' in top_artists:
-            artists_data = top_artists['data']
-        elif isinstance(top_artists, list):
-            artists_data = top_artists
+        found = find_artists(top_artists)
+        artists_data = found[1] if found else None
         
         if artists_data:
             print("Your top artists this month:")
@@ -78,5 +202,20 @@ def main():
     else:
         print("Failed to get top artists data")
 
+def add_arguments(parser):
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT, help=f"seconds to wait for each endpoint, retries included (default: {DEFAULT_TIMEOUT})")
+    add_rate_arguments(parser)
+    add_profile_arguments(parser)
+
+def run_cli(args, parser):
+    enable_from_args(args)
+    try:
+        configure_from_args(args)
+    except ValueError as e:
+        parser.error(str(e))
+    main(args.timeout)
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    add_arguments(parser)
+    run_cli(parser.parse_args(), parser)
\ No newline at end of file
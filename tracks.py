@@ -1,161 +1,359 @@
-import asyncio
-import re
-from typing import Optional
-from yandex_music import ClientAsync
-from yandex_music.track.track import Track
-from yandex_music.exceptions import NetworkError
-
-class YandexMusicTrackFetcher:
-    def __init__(self, token: str):
-        self.token = token
-        self.client = None
-
-    async def connect(self):
-        self.client = ClientAsync(self.token)
-        await self.client.init()
-
-    @staticmethod
-    def extract_track_id(url: str) -> str:
-        if not url:
-            raise ValueError("Track ID or URL cannot be empty")
-
-        # Pattern to match Yandex Music track URLs
-        pattern = r'music\.yandex\.(ru|com|by|kz)/album/\d+/track/(\d+)'
-        match = re.search(pattern, url)
-        
-        return match.group(2) if match else url
-
-    async def fetch_track(self, track_id: str) -> Optional[dict]:
-        try:
-            if not self.client:
-                await self.connect()
-
-            track = await self.client.tracks(track_id)
-            track = track[0]  # Get the first track from the list
-
-            label_name = 'N/A'
-            if hasattr(track, 'albums') and track.albums and hasattr(track.albums[0], 'labels') and track.albums[0].labels:
-                label_name = ', '.join([label.name for label in track.albums[0].labels])
-
-            major_name = "Unknown Distributor"
-            if hasattr(track, 'major') and track.major:
-                major_name = track.major.name
-            elif hasattr(track, 'albums') and track.albums and hasattr(track.albums[0], 'major') and track.albums[0].major:
-                major_name = track.albums[0].major.name
-
-            distributor_mapping = {
-                "UNIVERSAL_MUSIC": "Universal Music Group",
-                "UNIVERSAL_YANGO": "Universal Music Group (in Israel and Middle East)",
-                "UNIKOP": "Universal Music Group (stolen releases in Russia)",
-                "BELIEVE_DIGITAL": "Believe Digital",
-                "TUNECORE": "TuneCore",
-                "SONY": "Sony Music Entertainment",
-                "WARNER": "Warner Music Group",
-                "BROMA16": "Broma16",
-                "BEGGARS": "Beggars Group",
-                "SYMPHONIC": "Symphonic Distribution",
-                "DISTROKID": "DistroKid",
-                "FRESH_TUNES": "FreshTunes",
-                "LABEL_ENGINE": "Label Engine",
-                "ORCHARD": "The Orchard",
-                "ONERPM": "ONErpm",
-                "WORX": "LabelWorx",
-                "RESERVOIR": "Reservoir Media",
-                "IIP_DDS": "IIP-DDS"
-            }
-            
-            if major_name in distributor_mapping:
-                major_name = distributor_mapping[major_name]
-
-            release_date = track.albums[0].release_date[:10] if hasattr(track.albums[0], 'release_date') and track.albums[0].release_date else "Unknown Date"
-            
-            artists = []
-            if hasattr(track, 'artists'):
-                artists = ', '.join([artist.name for artist in track.artists])
-
-            available_countries = track.albums[0].regions if hasattr(track.albums[0], 'regions') else []
-
-            return {
-                'title': getattr(track, 'title', 'Unknown'),
-                'version': getattr(track, 'version', None),
-                'year': getattr(track.albums[0], 'year', 'N/A'),
-                'label': label_name,
-                'major': major_name,
-                'release_date': release_date,
-                'artists': artists,
-                'duration_ms': getattr(track, 'duration_ms', 0),
-                'available_countries': available_countries,
-                'content_warning': getattr(track, 'content_warning', 'None'),
-                'type': getattr(track, 'type', 'Unknown'),
-                'track_sharing_flag': getattr(track, 'track_sharing_flag', False),
-                'track_source': getattr(track, 'track_source', 'Unknown')
-            }
-        except NetworkError as e:
-            if 'Parameters requirements are not met' in str(e):
-                raise ConnectionError("Network error: The provided parameters do not meet the requirements.")
-            raise ConnectionError(f"Network error: {e}")
-        except Exception as e:
-            raise RuntimeError(f"Failed to fetch track: {e}")
-
-    def format_track_info(self, track_data: dict) -> str:
-        output = []
-        title = track_data['title']
-        if track_data['version']:
-            title += f" ({track_data['version']})"
-        output.append(f"Track Title: {title}")
-        output.append(f"Artist: {track_data['artists']}")
-        output.append(f"Release Date: {track_data['year']}")
-        output.append(f"Release Date: {track_data['release_date']}")
-        
-        duration_min = track_data['duration_ms'] // 60000
-        duration_sec = (track_data['duration_ms'] % 60000) // 1000
-        output.append(f"Duration: {duration_min}:{duration_sec:02d}")
-        
-        output.append(f"\n℗ {track_data['year']} {track_data['label']}")
-        if track_data['available_countries']:
-            output.append(f"Available in: {', '.join(track_data['available_countries'])}")
-        output.append(f"Distributed by {track_data['major']}")
-        output.append(f"Content Warning: {track_data['content_warning']}")
-        output.append(f"Type: {track_data['type']}")
-        output.append(f"Track Sharing Flag: {track_data['track_sharing_flag']}")
-        output.append(f"Track Source: {track_data['track_source']}")
-        
-        return '\n'.join(output)
-
-async def main():
-    while True:
-        try:
-            track_input = input("Enter the Yandex Music track ID or URL: ").strip()
-            if not track_input:
-                print("Input cannot be empty. Please enter a valid track ID or URL.")
-                continue
-
-            if track_input.lower() in ['exit', 'quit', 'leave']:
-                print("Exiting the program.")
-                break
-
-            if not re.match(r'^\d+$', track_input) and not re.match(r'^https?://', track_input):
-                print("Invalid input. Please enter a valid track ID or URL.")
-                continue
-            
-            token = "YOUR_TOKEN"
-
-            fetcher = YandexMusicTrackFetcher(token)
-            track_id = fetcher.extract_track_id(track_input)
-            track_data = await fetcher.fetch_track(track_id)
-            print("\n" + fetcher.format_track_info(track_data))
-
-        except (ValueError, ConnectionError, RuntimeError) as e:
-            print(f"Error: {e}")
-        except KeyboardInterrupt:
-            print("\nOperation cancelled by user")
-            break
-
-        try_again = input("Do you want to try again? (yes/no): ").strip().lower()
-        if try_again in ['yes', 'y']:
-            continue
-        else:
-            break
-
-if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+import argparse
+import sys
+from typing import TYPE_CHECKING, AsyncIterator, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import session
+from cache import CacheMiss, MetadataCache, add_cache_arguments, cache_from_args
+from distributors import distributor_name
+from links import extract_id
+from memo import Memo, shared as shared_memo
+from profiling import add_profile_arguments, enable_from_args, profiler
+from records import TrackRecord
+from scheduler import BULK, add_rate_arguments, configure_from_args, priority
+from writers import add_output_arguments, get_writer, open_output
+
+if TYPE_CHECKING:
+    from yandex_music import Album, Track
+
+DESCRIPTION = "Fetch track information from Yandex Music"
+
+
+class BatchError(RuntimeError):
+    # The request for a whole batch failed, so it says nothing about whether its tracks exist
+    pass
+
+
+class YandexMusicTrackFetcher:
+    def __init__(self, token: str, cache: Optional[MetadataCache] = None, memo: Optional[Memo] = None):
+        self.token = token
+        self.client = None
+        self.cache = cache
+        self.memo = memo if memo is not None else shared_memo
+
+    async def connect(self):
+        self.client = await session.get_client(self.token)
+
+    @staticmethod
+    def extract_track_id(url: str) -> str:
+        return extract_id(url, 'track')
+
+    async def fetch_track(self, track_id: str) -> Optional[TrackRecord]:
+        try:
+            cached = self._get_cached_record(track_id)
+            if cached is not None:
+                return cached
+
+            with profiler.measure('fetch.track'):
+                tracks = await self._get_tracks([track_id])
+            if track_id not in tracks:
+                if self.cache and self.cache.offline:
+                    raise CacheMiss(f"track {track_id} is not in the cache")
+                raise LookupError(f"Track {track_id} not found")
+
+            return self._build_track_data(*tracks[track_id])
+        except session.network_error() as e:
+            if 'Parameters requirements are not met' in str(e):
+                raise ConnectionError("Network error: The provided parameters do not meet the requirements.")
+            raise ConnectionError(f"Network error: {e}")
+        except Exception as e:
+            raise RuntimeError(f"Failed to fetch track: {e}")
+
+    def _get_cached_record(self, track_id: str) -> Optional[TrackRecord]:
+        # Tracks already in memory skip the cache, cached ones never need the API client. Records are cached
+        # under the ID as asked for, since "track:album" takes its label, year and regions from that album
+        key, _, album_id = track_id.partition(':')
+        if not self.cache or self.memo.album_track(key, album_id or None) is not None or self.memo.get(('track', key)) is not None:
+            return None
+
+        cached = self.cache.get('track', track_id)
+        return TrackRecord.from_dict(cached) if cached is not None else None
+
+    async def _get_tracks(self, track_ids: List[str]) -> Dict[str, Tuple['Track', Optional['Album']]]:
+        # Keys are the IDs as given, bare or "track:album"; a pair is answered with the data of that album
+        found = {}
+        requested = {}
+        for track_id in track_ids:
+            key, _, album_id = track_id.partition(':')
+            # Tracks of an album already fetched with albums_with_tracks come with the full album data,
+            # as long as it is the album asked for or, without one, the track's own
+            from_album = self.memo.album_track(key, album_id or None)
+            if from_album is not None:
+                found[track_id] = from_album
+            else:
+                requested.setdefault(('track', key), []).append(track_id)
+
+        if requested:
+            tracks = await self.memo.get_or_fetch_many(requested, lambda keys: self._load_tracks([track_id for key in keys for track_id in requested[key]]))
+            for key, track in tracks.items():
+                for track_id in requested[key]:
+                    found[track_id] = (track, self._requested_album(track, track_id))
+
+        return found
+
+    @staticmethod
+    def _requested_album(track, track_id: str) -> Optional['Album']:
+        # The album named in "track:album" among those the track is on; None means the track's first album
+        album_id = track_id.partition(':')[2]
+        if not album_id:
+            return None
+        return next((album for album in getattr(track, 'albums', None) or [] if str(album.id) == album_id), None)
+
+    async def _load_tracks(self, track_ids: List[str]) -> dict:
+        found = {}
+        if self.cache and self.cache.offline:
+            return found
+
+        if not self.client:
+            await self.connect()
+
+        # Each track is asked for once, whichever albums it was wanted from
+        unique = {}
+        for track_id in track_ids:
+            unique.setdefault(track_id.partition(':')[0], track_id)
+
+        for track in await self.client.tracks(list(unique.values())):
+            found[('track', str(track.id))] = track
+            self._cache_record(str(track.id), track)
+
+        for track_id in track_ids:
+            track = found.get(('track', track_id.partition(':')[0]))
+            if track is not None and track_id != str(track.id):
+                self._cache_record(track_id, track)
+
+        return found
+
+    def _cache_record(self, track_id: str, track: 'Track'):
+        if not self.cache:
+            return
+        try:
+            self.cache.put('track', track_id, self._build_track_data(track, self._requested_album(track, track_id)).to_dict())
+        except Exception:
+            # Not cached; the caller builds the record again and reports the error for this track
+            pass
+
+    def _build_track_data(self, track, album=None) -> TrackRecord:
+        if album is None:
+            album = track.albums[0]
+
+        label_name = 'N/A'
+        if hasattr(album, 'labels') and album.labels:
+            label_name = ', '.join([label.name for label in album.labels])
+
+        major_name = "Unknown Distributor"
+        if hasattr(track, 'major') and track.major:
+            major_name = track.major.name
+        elif hasattr(album, 'major') and album.major:
+            major_name = album.major.name
+
+        major_name = distributor_name(major_name)
+
+        release_date = album.release_date[:10] if hasattr(album, 'release_date') and album.release_date else "Unknown Date"
+        
+        artists = []
+        if hasattr(track, 'artists'):
+            artists = ', '.join([artist.name for artist in track.artists])
+
+        available_countries = album.regions if hasattr(album, 'regions') else []
+
+        return TrackRecord(
+            id=str(track.id),
+            title=getattr(track, 'title', 'Unknown'),
+            version=getattr(track, 'version', None),
+            year=getattr(album, 'year', 'N/A'),
+            label=label_name,
+            major=major_name,
+            release_date=release_date,
+            artists=artists,
+            duration_ms=getattr(track, 'duration_ms', 0),
+            available_countries=available_countries,
+            content_warning=getattr(track, 'content_warning', 'None'),
+            type=getattr(track, 'type', 'Unknown'),
+            track_sharing_flag=getattr(track, 'track_sharing_flag', False),
+            track_source=getattr(track, 'track_source', 'Unknown'),
+        )
+
+    async def fetch_tracks(self, track_ids: Iterable[str], batch_size: int = 100) -> AsyncIterator[Tuple[str, Optional[TrackRecord], Optional[Exception]]]:
+        if batch_size < 1:
+            raise ValueError("Batch size must be a positive number")
+
+        batch = []
+        for track_id in track_ids:
+            batch.append(track_id)
+            if len(batch) >= batch_size:
+                async for result in self._fetch_batch(batch):
+                    yield result
+                batch = []
+
+        if batch:
+            async for result in self._fetch_batch(batch):
+                yield result
+
+    async def _fetch_batch(self, batch: List[str]) -> AsyncIterator[Tuple[str, Optional[TrackRecord], Optional[Exception]]]:
+        cached = {}
+        for track_id in batch:
+            record = self._get_cached_record(track_id)
+            if record is not None:
+                cached[track_id] = record
+        missing = [track_id for track_id in batch if track_id not in cached]
+
+        found = {}
+        error = None
+        try:
+            with profiler.measure('fetch.track_batch'):
+                found = await self._get_tracks(missing) if missing else {}
+        except session.network_error() as e:
+            error = ConnectionError(f"Network error: {e}")
+        except Exception as e:
+            error = BatchError(f"Failed to fetch tracks: {e}")
+
+        # The API answers with the tracks it found, so match them back to the requested IDs
+        for track_id in batch:
+            if track_id in cached:
+                yield track_id, cached[track_id], None
+                continue
+            if error is not None:
+                yield track_id, None, error
+                continue
+
+            entry = found.get(track_id)
+            if entry is None:
+                if self.cache and self.cache.offline:
+                    yield track_id, None, CacheMiss(f"track {track_id} is not in the cache")
+                    continue
+                yield track_id, None, LookupError(f"Track {track_id} not found")
+                continue
+            try:
+                yield track_id, self._build_track_data(*entry), None
+            except Exception as e:
+                yield track_id, None, RuntimeError(f"Failed to fetch track: {e}")
+
+    @profiler.timed('format.track')
+    def format_track_info(self, track: TrackRecord) -> str:
+        output = []
+        title = track.title
+        if track.version:
+            title += f" ({track.version})"
+        output.append(f"Track Title: {title}")
+        output.append(f"Artist: {track.artists}")
+        output.append(f"Release Date: {track.year}")
+        output.append(f"Release Date: {track.release_date}")
+        
+        duration_min = track.duration_ms // 60000
+        duration_sec = (track.duration_ms % 60000) // 1000
+        output.append(f"Duration: {duration_min}:{duration_sec:02d}")
+        
+        output.append(f"\n℗ {track.year} {track.label}")
+        if track.available_countries:
+            output.append(f"Available in: {', '.join(track.available_countries)}")
+        output.append(f"Distributed by {track.major}")
+        output.append(f"Content Warning: {track.content_warning}")
+        output.append(f"Type: {track.type}")
+        output.append(f"Track Sharing Flag: {track.track_sharing_flag}")
+        output.append(f"Track Source: {track.track_source}")
+        
+        return '\n'.join(output)
+
+def read_track_ids(lines: Iterable[str]) -> Iterator[str]:
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+
+        try:
+            track_id = YandexMusicTrackFetcher.extract_track_id(line)
+        except ValueError:
+            print(f"Skipping invalid track ID or URL: {line}", file=sys.stderr)
+            continue
+
+        yield track_id
+
+
+async def batch_main(source: str, batch_size: int, cache: Optional[MetadataCache] = None,
+                     output_format: str = 'text', output: Optional[str] = None):
+    token = "YOUR_TOKEN"
+
+    fetcher = YandexMusicTrackFetcher(token, cache)
+    stream = sys.stdin if source == '-' else open(source, encoding='utf-8')
+    out = open_output(output)
+    writer = get_writer(output_format, 'track', out, fetcher.format_track_info)
+    try:
+        async for track_id, track_data, error in fetcher.fetch_tracks(read_track_ids(stream), batch_size):
+            if error:
+                print(f"Error: {track_id}: {error}", file=sys.stderr, flush=True)
+                continue
+            writer.write(track_data)
+    except (ValueError, ConnectionError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+    finally:
+        writer.close()
+        if out is not sys.stdout:
+            out.close()
+        if stream is not sys.stdin:
+            stream.close()
+
+
+async def main(cache: Optional[MetadataCache] = None):
+    token = "YOUR_TOKEN"
+    fetcher = YandexMusicTrackFetcher(token, cache)
+
+    while True:
+        try:
+            track_input = input("Enter the Yandex Music track ID or URL: ").strip()
+            if not track_input:
+                print("Input cannot be empty. Please enter a valid track ID or URL.")
+                continue
+
+            if track_input.lower() in ['exit', 'quit', 'leave']:
+                print("Exiting the program.")
+                break
+
+            track_id = fetcher.extract_track_id(track_input)
+            track_data = await fetcher.fetch_track(track_id)
+            print("\n" + fetcher.format_track_info(track_data))
+
+        except (ValueError, ConnectionError, RuntimeError) as e:
+            print(f"Error: {e}")
+        except KeyboardInterrupt:
+            print("\nOperation cancelled by user")
+            break
+
+        try_again = input("Do you want to try again? (yes/no): ").strip().lower()
+        if try_again in ['yes', 'y']:
+            continue
+        else:
+            break
+
+
+def add_arguments(parser):
+    parser.add_argument('--batch', metavar='FILE', help="read track IDs or URLs from FILE (one per line, '-' for stdin) instead of prompting")
+    parser.add_argument('--batch-size', type=int, default=100, help="number of tracks requested per API call in batch mode (default: 100)")
+    add_output_arguments(parser)
+    add_cache_arguments(parser)
+    add_rate_arguments(parser)
+    add_profile_arguments(parser)
+
+
+def run_cli(args, parser):
+    enable_from_args(args)
+
+    try:
+        cache = cache_from_args(args)
+        configure_from_args(args)
+    except ValueError as e:
+        parser.error(str(e))
+
+    try:
+        if args.batch:
+            with priority(BULK):
+                session.run(batch_main(args.batch, args.batch_size, cache, args.format, args.output))
+        else:
+            session.run(main(cache))
+    finally:
+        if cache:
+            cache.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    add_arguments(parser)
+    run_cli(parser.parse_args(), parser)
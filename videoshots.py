@@ -1,57 +1,376 @@
+import argparse
 import asyncio
-import re
-from typing import Optional
-from yandex_music import ClientAsync
-from yandex_music.track.track import Track
-from yandex_music.exceptions import NetworkError
+import os
+import sys
+from typing import TYPE_CHECKING, AsyncIterable, AsyncIterator, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from urllib.parse import urlparse
+
+import session
+from albums import YandexMusicFetcher, _aiter
+from cache import CacheMiss, MetadataCache, add_cache_arguments, cache_from_args
+from links import extract_id
+from memo import Memo, shared as shared_memo
+from profiling import add_profile_arguments, enable_from_args, profiler
+from records import VideoRecord
+from scheduler import BULK, add_rate_arguments, configure_from_args, priority
+from writers import add_output_arguments, get_writer, open_output
+
+if TYPE_CHECKING:
+    from yandex_music import Track
+
+DESCRIPTION = "Find videoshots attached to Yandex Music tracks"
 
 class YandexMusicTrackFetcher:
-    def __init__(self, token: str):
+    def __init__(self, token: str, cache: Optional[MetadataCache] = None, memo: Optional[Memo] = None):
         self.token = token
         self.client = None
+        self.cache = cache
+        self.memo = memo if memo is not None else shared_memo
 
     async def connect(self):
-        self.client = ClientAsync(self.token)
-        await self.client.init()
+        self.client = await session.get_client(self.token)
 
     @staticmethod
     def extract_track_id(url: str) -> str:
-        if not url:
-            raise ValueError("Track ID or URL cannot be empty")
+        return extract_id(url, 'track')
 
-        pattern = r'music\.yandex\.(ru|com|by|kz)/album/\d+/track/(\d+)'
-        match = re.search(pattern, url)
-        
-        return match.group(2) if match else url
+    @staticmethod
+    def extract_playlist_id(url: str) -> Tuple[str, str]:
+        # Playlists are addressed by owner and kind, either from a link or written as "owner:kind"
+        owner, kind = extract_id(url, 'playlist').split(':')
+        return owner, kind
     
-    async def fetch_track_videos(self, track_id: str) -> Optional[dict]:
+    async def fetch_track_videos(self, track_id: str) -> Optional[List[VideoRecord]]:
+        try:
+            cached = self.cache.get('videoshot', track_id) if self.cache else None
+            if cached is not None:
+                videos = [VideoRecord.from_dict(video) for video in cached]
+            else:
+                if self.cache and self.cache.offline:
+                    raise CacheMiss(f"track {track_id} is not in the cache")
+                with profiler.measure('fetch.videoshot'):
+                    videos = await self._get_track_videos(track_id)
+                # Tracks without a videoshot are cached too, as an empty list
+                if self.cache:
+                    self.cache.put('videoshot', track_id, [video.to_dict() for video in videos])
+
+            if not videos:
+                raise ValueError("No video found for this track")
+
+            return videos
+
+        except session.network_error() as e:
+            raise ConnectionError(f"Network error: {e}")
+        except Exception as e:
+            raise RuntimeError(f"Failed to fetch video data: {e}")
+
+    async def _get_track_videos(self, track_id: str) -> List[VideoRecord]:
+        key = track_id.split(':')[0]
+        # Videos belong to the track itself, so any album holding it will do
+        track = self.memo.any_album_track(key)
+        if track is None:
+            track = await self.memo.get_or_fetch(('track', key), lambda: self._load_track(track_id))
+
+        return self._video_records(track)
+
+    def _video_records(self, track: 'Track') -> List[VideoRecord]:
+        if not track.background_video_uri:
+            return []
+
+        # Get the first artist's name
+        artist_name = track.artists[0].name if track.artists else "Unknown Artist"
+
+        return [VideoRecord(
+            track_id=str(track.id),
+            title=track.title,
+            artist=artist_name,
+            cover_uri=track.cover_uri,
+            embed_url=track.background_video_uri,
+            provider_video_id=None,
+        )]
+
+    async def _load_track(self, track_id: str) -> 'Track':
+        if not self.client:
+            await self.connect()
+
+        track = await self.client.tracks(track_id)
+        return track[0]
+
+    async def scan_videos(self, track_ids: Union[Iterable[str], AsyncIterable[str]], batch_size: int = 100) -> AsyncIterator[Tuple[str, Optional[List[VideoRecord]], Optional[Exception]]]:
+        # Unlike fetch_track_videos, a track without a videoshot is a normal result here: an empty list
+        if batch_size < 1:
+            raise ValueError("Batch size must be a positive number")
+
+        batch = []
+        async for track_id in _aiter(track_ids):
+            batch.append(track_id)
+            if len(batch) >= batch_size:
+                async for result in self._scan_batch(batch):
+                    yield result
+                batch = []
+
+        if batch:
+            async for result in self._scan_batch(batch):
+                yield result
+
+    async def _scan_batch(self, batch: List[str]) -> AsyncIterator[Tuple[str, Optional[List[VideoRecord]], Optional[Exception]]]:
+        cached = {}
+        missing = []
+        for track_id in batch:
+            videos = self.cache.get('videoshot', track_id) if self.cache else None
+            if videos is not None:
+                cached[track_id] = [VideoRecord.from_dict(video) for video in videos]
+            elif not (self.cache and self.cache.offline):
+                missing.append(track_id)
+
+        found = {}
+        error = None
+        try:
+            if missing:
+                with profiler.measure('fetch.videoshot_batch'):
+                    found = await self._get_tracks(missing)
+        except session.network_error() as e:
+            error = ConnectionError(f"Network error: {e}")
+        except Exception as e:
+            error = RuntimeError(f"Failed to fetch video data: {e}")
+
+        for track_id in batch:
+            if track_id in cached:
+                yield track_id, cached[track_id], None
+                continue
+            if self.cache and self.cache.offline:
+                yield track_id, None, CacheMiss(f"track {track_id} is not in the cache")
+                continue
+            if error is not None:
+                yield track_id, None, error
+                continue
+
+            track = found.get(track_id.split(':')[0])
+            if track is None:
+                yield track_id, None, LookupError(f"Track {track_id} not found")
+                continue
+
+            try:
+                videos = self._video_records(track)
+            except Exception as e:
+                yield track_id, None, RuntimeError(f"Failed to fetch video data: {e}")
+                continue
+            if self.cache:
+                self.cache.put('videoshot', track_id, [video.to_dict() for video in videos])
+            yield track_id, videos, None
+
+    async def _get_tracks(self, track_ids: List[str]) -> Dict[str, 'Track']:
+        # One tracks() call for everything not already known from an album or an earlier lookup
+        found = {}
+        requested = {}
+        for track_id in track_ids:
+            key = track_id.split(':')[0]
+            from_album = self.memo.any_album_track(key)
+            if from_album is not None:
+                found[key] = from_album
+            else:
+                requested[('track', key)] = track_id
+
+        if requested:
+            tracks = await self.memo.get_or_fetch_many(requested, lambda keys: self._load_tracks([requested[key] for key in keys]))
+            for (_, key), track in tracks.items():
+                found[key] = track
+
+        return found
+
+    async def _load_tracks(self, track_ids: List[str]) -> dict:
+        if not self.client:
+            await self.connect()
+
+        return {('track', str(track.id)): track for track in await self.client.tracks(track_ids)}
+
+    async def iter_album_track_ids(self, album_id: str) -> AsyncIterator[str]:
+        # Goes through the album fetcher so the album is cached and its tracks land in the shared memo
+        album = await YandexMusicFetcher(self.token, self.cache, self.memo).fetch_album(album_id)
+        for volume in album.volumes:
+            for entry in volume:
+                yield entry.id
+
+    async def iter_playlist_track_ids(self, owner: str, kind: str) -> AsyncIterator[str]:
+        if self.cache and self.cache.offline:
+            raise CacheMiss(f"playlist {owner}:{kind} is not cached")
         try:
             if not self.client:
                 await self.connect()
+            playlist = await self.client.users_playlists(kind, owner)
+        except session.network_error() as e:
+            raise ConnectionError(f"Network error: {e}")
+        except Exception as e:
+            raise RuntimeError(f"Failed to fetch playlist: {e}")
+        if not playlist:
+            raise LookupError(f"Playlist {owner}:{kind} not found")
 
-            track = await self.client.tracks(track_id)
-            track = track[0]
+        for track_short in playlist.tracks or []:
+            yield str(track_short.id)
 
-            if not track.background_video_uri:
-                raise ValueError("No video found for this track")
 
-            # Get the first artist's name
-            artist_name = track.artists[0].name if track.artists else "Unknown Artist"
+async def download_video(http, url: str, path: str, chunk_size: int = 64 * 1024) -> int:
+    # Chunks go to a .part file that is renamed when complete, an interrupted download resumes with a Range request
+    if os.path.exists(path):
+        return 0
 
-            return [{
-                'title': track.title,
-                'cover_uri': track.cover_uri,
-                'artist': artist_name,
-                'embed_url': track.background_video_uri,
-                'provider_video_id': None
-            }]
+    part = path + '.part'
+    offset = os.path.getsize(part) if os.path.exists(part) else 0
+    headers = {'Range': f'bytes={offset}-'} if offset else {}
 
-        except NetworkError as e:
-            raise ConnectionError(f"Network error: {e}")
+    written = 0
+    with profiler.measure('download.videoshot'):
+        async with http.get(url, headers=headers) as resp:
+            if offset and resp.status == 416:
+                # Nothing left past the end of the partial file, so it was already complete
+                os.replace(part, path)
+                return 0
+            resp.raise_for_status()
+
+            mode = 'wb'
+            if resp.status == 206:
+                if not resp.headers.get('Content-Range', '').startswith(f'bytes {offset}-'):
+                    raise RuntimeError(f"Server resumed {url} from the wrong offset")
+                mode = 'ab'
+
+            with open(part, mode) as f:
+                async for chunk in resp.content.iter_chunked(chunk_size):
+                    f.write(chunk)
+                    written += len(chunk)
+
+    profiler.record('download.bytes', nbytes=written)
+    os.replace(part, path)
+    return written
+
+
+def video_path(directory: str, video: VideoRecord) -> str:
+    extension = os.path.splitext(urlparse(video.embed_url).path)[1] or '.mp4'
+    return os.path.join(directory, f"{video.track_id}{extension}")
+
+def read_track_ids(lines: Iterable[str]) -> Iterator[str]:
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+
+        try:
+            track_id = YandexMusicTrackFetcher.extract_track_id(line)
+        except ValueError:
+            print(f"Skipping invalid track ID or URL: {line}", file=sys.stderr)
+            continue
+
+        yield track_id
+
+@profiler.timed('format.videoshot')
+def format_video_info(video: VideoRecord) -> str:
+    return f"Title: {video.title}\nArtist: {video.artist}\nVideo URL: {video.embed_url}"
+
+async def scan_main(source: Optional[str], albums: List[str], playlists: List[str], batch_size: int = 100,
+                    cache: Optional[MetadataCache] = None, output_format: str = 'text', output: Optional[str] = None,
+                    download_dir: Optional[str] = None, download_concurrency: int = 4):
+    token = "YOUR_TOKEN"
+
+    fetcher = YandexMusicTrackFetcher(token, cache)
+    stream = None
+    if source:
+        stream = sys.stdin if source == '-' else open(source, encoding='utf-8')
+    out = open_output(output)
+    writer = get_writer(output_format, 'videoshot', out, format_video_info)
+    if download_dir:
+        os.makedirs(download_dir, exist_ok=True)
+    semaphore = asyncio.Semaphore(download_concurrency)
+    downloads = set()
+    checked = with_video = failed = downloaded = 0
+
+    async def track_ids():
+        # Albums first, then playlists, then the ID list; a track that shows up twice is only checked once
+        seen = set()
+
+        def first_time(track_id):
+            key = track_id.split(':')[0]
+            if key in seen:
+                return False
+            seen.add(key)
+            return True
+
+        for album_input in albums:
+            try:
+                album_id = YandexMusicFetcher.extract_album_id(album_input)
+                async for track_id in fetcher.iter_album_track_ids(album_id):
+                    if first_time(track_id):
+                        yield track_id
+            except (ValueError, LookupError, ConnectionError, RuntimeError) as e:
+                print(f"Error: album {album_input}: {e}", file=sys.stderr, flush=True)
+
+        for playlist_input in playlists:
+            try:
+                owner, kind = fetcher.extract_playlist_id(playlist_input)
+                async for track_id in fetcher.iter_playlist_track_ids(owner, kind):
+                    if first_time(track_id):
+                        yield track_id
+            except (ValueError, LookupError, ConnectionError, RuntimeError) as e:
+                print(f"Error: playlist {playlist_input}: {e}", file=sys.stderr, flush=True)
+
+        if stream is not None:
+            for track_id in read_track_ids(stream):
+                if first_time(track_id):
+                    yield track_id
+
+    async def download(video: VideoRecord):
+        # Runs with a slot the scan already took from the semaphore
+        nonlocal downloaded
+        try:
+            await download_video(session.get_download_session(), video.embed_url, video_path(download_dir, video))
+            downloaded += 1
         except Exception as e:
-            raise RuntimeError(f"Failed to fetch video data: {e}")
+            print(f"Error: download {video.track_id}: {e}", file=sys.stderr, flush=True)
+        finally:
+            semaphore.release()
+
+    try:
+        async for track_id, videos, error in fetcher.scan_videos(track_ids(), batch_size):
+            checked += 1
+            if error:
+                failed += 1
+                print(f"Error: {track_id}: {error}", file=sys.stderr, flush=True)
+                continue
+
+            with_video += bool(videos)
+            for video in videos:
+                writer.write(video)
+                if download_dir:
+                    # Downloads run alongside the scan; once download_concurrency are running the scan waits
+                    # for one to finish, so a large catalog never piles up pending downloads
+                    await semaphore.acquire()
+                    task = asyncio.ensure_future(download(video))
+                    downloads.add(task)
+                    task.add_done_callback(downloads.discard)
+
+        await asyncio.gather(*downloads)
+    except (ValueError, ConnectionError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+    finally:
+        for task in list(downloads):
+            task.cancel()
+        writer.close()
+        if out is not sys.stdout:
+            out.close()
+        if stream is not None and stream is not sys.stdin:
+            stream.close()
+
+    scanned = checked - failed
+    coverage = with_video / scanned * 100 if scanned else 0.0
+    summary = f"Videoshots: {with_video} of {scanned} tracks ({coverage:.1f}%)"
+    if failed:
+        summary += f", {failed} failed"
+    if download_dir:
+        summary += f", {downloaded} of {len(downloads)} downloaded to {download_dir}"
+    print(summary, file=sys.stderr)
+
+async def main(cache: Optional[MetadataCache] = None):
+    token = "YOUR_TOKEN"
+    fetcher = YandexMusicTrackFetcher(token, cache)
 
-async def main():
     while True:
         try:
             track_input = input("Enter the Yandex Music track ID or URL: ").strip()
@@ -63,16 +382,14 @@ async def main():
                 print("Exiting the program.")
                 break
 
-            token = "YOUR_TOKEN"
-            fetcher = YandexMusicTrackFetcher(token)
             track_id = fetcher.extract_track_id(track_input)
             videos = await fetcher.fetch_track_videos(track_id)
 
             print("\nFound videos:")
             for video in videos:
-                print(f"\nTitle: {video['title']}")
-                print(f"Artist: {video['provider']}")
-                print(f"Video URL: {video['embed_url']}")
+                print(f"\nTitle: {video.title}")
+                print(f"Artist: {video.artist}")
+                print(f"Video URL: {video.embed_url}")
 
         except ValueError as e:
             print(f"Error: {e}")
@@ -86,5 +403,46 @@ async def main():
         if try_again not in ['yes', 'y']:
             break
 
+
+def add_arguments(parser):
+    parser.add_argument('--batch', metavar='FILE', help="read track IDs or URLs from FILE (one per line, '-' for stdin) instead of prompting")
+    parser.add_argument('--album', action='append', default=[], metavar='ID', help="check every track of an album ID or URL (can be repeated)")
+    parser.add_argument('--playlist', action='append', default=[], metavar='OWNER:KIND',
+                        help="check every track of a playlist, given as a link or owner:kind (can be repeated)")
+    parser.add_argument('--batch-size', type=int, default=100, help="number of tracks requested per API call when scanning (default: 100)")
+    parser.add_argument('--download', metavar='DIR', help="also download every videoshot found into DIR, resuming partial files")
+    parser.add_argument('--download-concurrency', type=int, default=4, help="maximum number of downloads at the same time (default: 4)")
+    add_output_arguments(parser)
+    add_cache_arguments(parser)
+    add_rate_arguments(parser)
+    add_profile_arguments(parser)
+
+
+def run_cli(args, parser):
+    enable_from_args(args)
+
+    if args.download_concurrency < 1:
+        parser.error("--download-concurrency must be a positive number")
+
+    try:
+        cache = cache_from_args(args)
+        configure_from_args(args)
+    except ValueError as e:
+        parser.error(str(e))
+
+    try:
+        if args.batch or args.album or args.playlist:
+            with priority(BULK):
+                session.run(scan_main(args.batch, args.album, args.playlist, args.batch_size, cache, args.format, args.output,
+                                      args.download, args.download_concurrency))
+        else:
+            session.run(main(cache))
+    finally:
+        if cache:
+            cache.close()
+
+
 if __name__ == "__main__":
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    add_arguments(parser)
+    run_cli(parser.parse_args(), parser)
@@ -0,0 +1,338 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import time
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import session
+from albums import YandexMusicFetcher, read_album_ids
+from cache import DATA_DIR
+from memo import Memo
+from profiling import add_profile_arguments, enable_from_args, profiler
+from scheduler import BULK, add_rate_arguments, configure_from_args, priority
+from tracks import YandexMusicTrackFetcher, read_track_ids
+from writers import get_writer, open_output
+
+DESCRIPTION = "Watch albums and tracks on Yandex Music and report what changed"
+
+DEFAULT_WATCH_PATH = os.path.join(DATA_DIR, 'watch.sqlite3')
+
+KINDS = ('album', 'track')
+
+# Snapshot rows are written in chunks of this many changes, so a long sweep does not hold one huge transaction
+COMMIT_EVERY = 500
+
+# Stored in place of the hash once an entry is gone from the service; it can never equal a 16-byte content hash
+REMOVED = b'removed'
+
+
+def normalize(record) -> str:
+    # The same release must always produce the same text, whatever order the API listed its regions in
+    data = record.to_dict()
+    data['available_countries'] = sorted(data.get('available_countries') or [])
+    return json.dumps(data, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+
+
+def content_hash(text: str) -> bytes:
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+
+
+def _diff_tracks(old: List[dict], new: List[dict]) -> dict:
+    old_by_id = {track['id']: track for track in old}
+    new_by_id = {track['id']: track for track in new}
+    changes = {}
+
+    added = [track_id for track_id in new_by_id if track_id not in old_by_id]
+    removed = [track_id for track_id in old_by_id if track_id not in new_by_id]
+    edited = [track_id for track_id, track in new_by_id.items() if track_id in old_by_id and old_by_id[track_id] != track]
+    if added:
+        changes['added'] = added
+    if removed:
+        changes['removed'] = removed
+    if edited:
+        changes['edited'] = edited
+
+    kept_old = [track['id'] for track in old if track['id'] in new_by_id]
+    kept_new = [track['id'] for track in new if track['id'] in old_by_id]
+    if kept_old != kept_new:
+        changes['reordered'] = True
+
+    return changes
+
+
+def diff_records(old: dict, new: dict) -> Dict[str, dict]:
+    changes = {}
+    for key in sorted(old.keys() | new.keys()):
+        before, after = old.get(key), new.get(key)
+        if key == 'track_count' or before == after:
+            continue
+
+        if key == 'tracks':
+            tracks = _diff_tracks(before or [], after or [])
+            if tracks:
+                changes[key] = tracks
+        elif isinstance(before, list) or isinstance(after, list):
+            before, after = before or [], after or []
+            changes[key] = {
+                'added': [value for value in after if value not in before],
+                'removed': [value for value in before if value not in after],
+            }
+        else:
+            changes[key] = {'old': before, 'new': after}
+    return changes
+
+
+class Change:
+    __slots__ = ('kind', 'id', 'title', 'changes')
+
+    def __init__(self, kind: str, id: str, title: str, changes: Dict[str, dict]):
+        self.kind = kind
+        self.id = id
+        self.title = title
+        self.changes = changes
+
+    def to_dict(self) -> dict:
+        return {'kind': self.kind, 'id': self.id, 'title': self.title, 'changes': self.changes}
+
+
+def format_change(change: Change) -> str:
+    output = [f"{change.kind.capitalize()} {change.id} ({change.title}) changed:"]
+    for key, diff in change.changes.items():
+        if key == 'tracks':
+            parts = [f"+{track_id}" for track_id in diff.get('added', [])]
+            parts += [f"-{track_id}" for track_id in diff.get('removed', [])]
+            parts += [f"~{track_id}" for track_id in diff.get('edited', [])]
+            if diff.get('reordered'):
+                parts.append("reordered")
+            output.append(f"  tracks: {' '.join(parts)}")
+        elif 'added' in diff:
+            parts = [f"+{value}" for value in diff['added']] + [f"-{value}" for value in diff['removed']]
+            output.append(f"  {key}: {' '.join(parts)}")
+        else:
+            output.append(f"  {key}: {diff['old']} -> {diff['new']}")
+    return '\n'.join(output)
+
+
+class Watchlist:
+    def __init__(self, path: str = DEFAULT_WATCH_PATH):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('''
+            CREATE TABLE IF NOT EXISTS watched (
+                kind TEXT NOT NULL,
+                id TEXT NOT NULL,
+                hash BLOB,
+                snapshot TEXT,
+                added_at REAL NOT NULL,
+                changed_at REAL,
+                PRIMARY KEY (kind, id)
+            ) WITHOUT ROWID
+        ''')
+        self._pending = 0
+
+    def add(self, kind: str, ids: Iterable[str]) -> int:
+        now = time.time()
+        before = self._db.total_changes
+        self._db.executemany('INSERT OR IGNORE INTO watched (kind, id, added_at) VALUES (?, ?, ?)',
+                             ((kind, item_id, now) for item_id in ids))
+        self._db.commit()
+        return self._db.total_changes - before
+
+    def remove(self, kind: str, ids: Iterable[str]) -> int:
+        before = self._db.total_changes
+        self._db.executemany('DELETE FROM watched WHERE kind = ? AND id = ?', ((kind, item_id) for item_id in ids))
+        self._db.commit()
+        return self._db.total_changes - before
+
+    def entries(self, kind: Optional[str] = None) -> List[Tuple[str, str, Optional[float]]]:
+        query = 'SELECT kind, id, changed_at FROM watched'
+        if kind:
+            return self._db.execute(query + ' WHERE kind = ? ORDER BY kind, id', (kind,)).fetchall()
+        return self._db.execute(query + ' ORDER BY kind, id').fetchall()
+
+    def hashes(self, kind: str) -> Dict[str, Optional[bytes]]:
+        # Only the 16-byte hashes are loaded up front, snapshots are read for the few entries that changed
+        return dict(self._db.execute('SELECT id, hash FROM watched WHERE kind = ?', (kind,)))
+
+    def snapshot(self, kind: str, item_id: str) -> Optional[str]:
+        row = self._db.execute('SELECT snapshot FROM watched WHERE kind = ? AND id = ?', (kind, item_id)).fetchone()
+        return row[0] if row else None
+
+    def store(self, kind: str, item_id: str, digest: bytes, snapshot: str, changed: bool):
+        self._db.execute('UPDATE watched SET hash = ?, snapshot = ?, changed_at = ? WHERE kind = ? AND id = ?',
+                         (digest, snapshot, time.time() if changed else None, kind, item_id))
+        self._pending += 1
+        if self._pending >= COMMIT_EVERY:
+            self.commit()
+
+    def commit(self):
+        self._db.commit()
+        self._pending = 0
+
+    def close(self):
+        self.commit()
+        self._db.close()
+
+
+async def sync(watchlist: Watchlist, writer, concurrency: int = 8, batch_size: int = 100) -> Counter:
+    token = "YOUR_TOKEN"
+    stats = Counter()
+
+    # A fresh memo per sweep, so nothing is answered from the previous one. Tracks get their own, so they
+    # always come from tracks() and never from whichever watched album happens to be held at that moment.
+    # The metadata cache is not used at all
+    album_fetcher = YandexMusicFetcher(token, None, Memo())
+    track_fetcher = YandexMusicTrackFetcher(token, None, Memo())
+
+    def removed(kind: str, item_id: str, known: Dict[str, Optional[bytes]]):
+        # Reported once, when the entry goes missing; the last snapshot is kept for when it comes back
+        if known[item_id] == REMOVED:
+            stats['unchanged'] += 1
+            return
+
+        snapshot = watchlist.snapshot(kind, item_id)
+        watchlist.store(kind, item_id, REMOVED, snapshot, changed=True)
+        stats['removed'] += 1
+        writer.write(Change(kind, item_id, json.loads(snapshot).get('title', ''), {'status': {'old': 'available', 'new': 'removed'}}))
+
+    def handle(kind: str, item_id: str, record, error: Optional[Exception], known: Dict[str, Optional[bytes]]):
+        # An ID that was never found is not a removal, it keeps being reported until taken off the list
+        if isinstance(error, LookupError) and known.get(item_id) is not None:
+            removed(kind, item_id, known)
+            return
+        if error:
+            stats['failed'] += 1
+            print(f"Error: {kind} {item_id}: {error}", file=sys.stderr, flush=True)
+            return
+
+        with profiler.measure(f'watch.compare.{kind}'):
+            text = normalize(record)
+            digest = content_hash(text)
+            previous = known.get(item_id)
+            if previous == digest:
+                stats['unchanged'] += 1
+                return
+
+            if previous is None:
+                stats['new'] += 1
+                watchlist.store(kind, item_id, digest, text, changed=False)
+                return
+
+            changes = diff_records(json.loads(watchlist.snapshot(kind, item_id)), json.loads(text))
+            if previous == REMOVED:
+                changes = {'status': {'old': 'removed', 'new': 'available'}, **changes}
+            watchlist.store(kind, item_id, digest, text, changed=True)
+
+        stats['changed'] += 1
+        writer.write(Change(kind, item_id, record.title, changes))
+
+    try:
+        known = watchlist.hashes('album')
+        async for album_id, record, error in album_fetcher.fetch_albums(list(known), concurrency):
+            handle('album', album_id, record, error, known)
+
+        known = watchlist.hashes('track')
+        async for track_id, record, error in track_fetcher.fetch_tracks(list(known), batch_size):
+            handle('track', track_id, record, error, known)
+    finally:
+        watchlist.commit()
+
+    return stats
+
+
+async def watch_main(watchlist: Watchlist, interval: Optional[float] = None, concurrency: int = 8, batch_size: int = 100,
+                     output_format: str = 'text', output: Optional[str] = None):
+    out = open_output(output)
+    writer = get_writer(output_format, 'change', out, format_change)
+    try:
+        while True:
+            started = time.monotonic()
+            stats = await sync(watchlist, writer, concurrency, batch_size)
+            print(f"Checked {sum(stats.values())}: {stats['changed']} changed, {stats['new']} new, "
+                  f"{stats['unchanged']} unchanged, {stats['removed']} removed, {stats['failed']} failed", file=sys.stderr, flush=True)
+            if not interval:
+                break
+            await asyncio.sleep(max(0.0, interval - (time.monotonic() - started)))
+    finally:
+        writer.close()
+        if out is not sys.stdout:
+            out.close()
+
+
+def read_ids(kind: str, lines: Iterable[str]) -> Iterable[str]:
+    if kind == 'album':
+        return read_album_ids(lines)
+    # Tracks are watched by bare ID, the album part of "track:album" is not needed to look them up
+    return (track_id.split(':')[0] for track_id in read_track_ids(lines))
+
+
+def add_arguments(parser):
+    parser.add_argument('--db', default=DEFAULT_WATCH_PATH, help=f"watchlist database (default: {DEFAULT_WATCH_PATH})")
+    commands = parser.add_subparsers(dest='watch_command', metavar='ACTION', required=True)
+
+    for name, summary in (('add', "add albums or tracks to the watchlist"), ('remove', "remove albums or tracks from the watchlist")):
+        command = commands.add_parser(name, help=summary, description=summary)
+        command.add_argument('kind', choices=KINDS)
+        command.add_argument('ids', nargs='*', metavar='ID', help="IDs or URLs")
+        command.add_argument('--file', metavar='FILE', help="also read IDs or URLs from FILE (one per line, '-' for stdin)")
+
+    command = commands.add_parser('list', help="show the watchlist", description="show the watchlist")
+    command.add_argument('kind', nargs='?', choices=KINDS)
+
+    command = commands.add_parser('sync', help="re-fetch everything on the watchlist and print what changed",
+                                  description="re-fetch everything on the watchlist and print what changed")
+    command.add_argument('--interval', type=float, metavar='SECONDS', help="keep running, starting a new sweep every SECONDS")
+    command.add_argument('--concurrency', type=int, default=8, help="maximum number of albums fetched at the same time (default: 8)")
+    command.add_argument('--batch-size', type=int, default=100, help="number of tracks requested per API call (default: 100)")
+    group = command.add_argument_group('output')
+    group.add_argument('--format', choices=('text', 'ndjson'), default='text', help="change report format (default: text)")
+    group.add_argument('--output', metavar='FILE', help="write the change report to FILE instead of stdout")
+    add_rate_arguments(command)
+    add_profile_arguments(command)
+
+
+def run_cli(args, parser):
+    watchlist = Watchlist(args.db)
+    try:
+        if args.watch_command in ('add', 'remove'):
+            lines = list(args.ids)
+            if args.file == '-':
+                lines.extend(sys.stdin)
+            elif args.file:
+                with open(args.file, encoding='utf-8') as stream:
+                    lines.extend(stream)
+            ids = list(read_ids(args.kind, lines))
+            if args.watch_command == 'add':
+                print(f"Added {watchlist.add(args.kind, ids)} of {len(ids)} {args.kind}s to the watchlist")
+            else:
+                print(f"Removed {watchlist.remove(args.kind, ids)} {args.kind}s from the watchlist")
+        elif args.watch_command == 'list':
+            for kind, item_id, changed_at in watchlist.entries(args.kind):
+                last_change = time.strftime('%Y-%m-%d %H:%M', time.localtime(changed_at)) if changed_at else "never"
+                print(f"{kind}\t{item_id}\tlast change: {last_change}")
+        else:
+            enable_from_args(args)
+            try:
+                configure_from_args(args)
+            except ValueError as e:
+                parser.error(str(e))
+            with priority(BULK):
+                session.run(watch_main(watchlist, args.interval, args.concurrency, args.batch_size, args.format, args.output))
+    except KeyboardInterrupt:
+        print("\nOperation cancelled by user", file=sys.stderr)
+    finally:
+        watchlist.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    add_arguments(parser)
+    run_cli(parser.parse_args(), parser)
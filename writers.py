@@ -0,0 +1,98 @@
+import csv
+import json
+import sys
+from typing import Callable, Optional, TextIO
+
+from profiling import profiler
+
+FORMATS = ('text', 'ndjson', 'csv')
+
+ALBUM_FIELDS = ['id', 'title', 'version', 'artists', 'year', 'release_date', 'label', 'major', 'available_countries', 'track_count']
+
+TRACK_FIELDS = ['id', 'title', 'version', 'artists', 'year', 'release_date', 'duration_ms', 'label', 'major',
+                'available_countries', 'content_warning', 'type', 'track_sharing_flag', 'track_source']
+
+VIDEOSHOT_FIELDS = ['track_id', 'title', 'artist', 'cover_uri', 'embed_url', 'provider_video_id']
+
+FIELDS = {
+    'album': ALBUM_FIELDS,
+    'track': TRACK_FIELDS,
+    'videoshot': VIDEOSHOT_FIELDS,
+}
+
+
+class NdjsonWriter:
+    def __init__(self, stream: TextIO, kind: str):
+        self.stream = stream
+        self.kind = kind
+
+    def write(self, record):
+        with profiler.measure(f'write.ndjson.{self.kind}'):
+            self.stream.write(json.dumps(record.to_dict(), ensure_ascii=False, separators=(',', ':')) + '\n')
+            self.stream.flush()
+
+    def close(self):
+        self.stream.flush()
+
+
+class CsvWriter:
+    def __init__(self, stream: TextIO, kind: str):
+        self.stream = stream
+        self.kind = kind
+        self.writer = csv.DictWriter(stream, fieldnames=FIELDS[kind], extrasaction='ignore')
+        self.header_written = False
+
+    def write(self, record):
+        with profiler.measure(f'write.csv.{self.kind}'):
+            if not self.header_written:
+                self.writer.writeheader()
+                self.header_written = True
+
+            data = record.to_dict()
+            row = {}
+            for key in FIELDS[self.kind]:
+                value = data.get(key)
+                row[key] = ' '.join(value) if isinstance(value, list) else value
+            self.writer.writerow(row)
+            self.stream.flush()
+
+    def close(self):
+        self.stream.flush()
+
+
+class TextWriter:
+    def __init__(self, stream: TextIO, formatter: Callable[[object], str]):
+        self.stream = stream
+        self.formatter = formatter
+
+    def write(self, record):
+        with profiler.measure('write.text'):
+            self.stream.write("\n" + self.formatter(record) + "\n")
+            self.stream.flush()
+
+    def close(self):
+        self.stream.flush()
+
+
+def get_writer(output_format: str, kind: str, stream: Optional[TextIO] = None, formatter: Optional[Callable[[object], str]] = None):
+    stream = stream or sys.stdout
+    if output_format == 'ndjson':
+        return NdjsonWriter(stream, kind)
+    if output_format == 'csv':
+        return CsvWriter(stream, kind)
+    if output_format == 'text' and formatter is not None:
+        return TextWriter(stream, formatter)
+    raise ValueError(f"Unsupported output format: {output_format}")
+
+
+def add_output_arguments(parser):
+    group = parser.add_argument_group('output')
+    group.add_argument('--format', choices=FORMATS, default='text', help="batch output format (default: text)")
+    group.add_argument('--output', metavar='FILE', help="write batch results to FILE instead of stdout")
+
+
+def open_output(path: Optional[str]) -> TextIO:
+    if not path or path == '-':
+        return sys.stdout
+    # newline='' keeps the csv module in charge of line endings
+    return open(path, 'w', encoding='utf-8', newline='')
@@ -0,0 +1,46 @@
+import argparse
+from typing import List, Optional
+
+import albums
+import artists
+import likes
+import links
+import regions
+import report
+import top
+import tracks
+import videoshots
+import watch
+
+# Subcommand -> script implementing it; every script can still be run on its own as before
+COMMANDS = {
+    'album': albums,
+    'track': tracks,
+    'videoshot': videoshots,
+    'artist': artists,
+    'top': top,
+    'report': report,
+    'watch': watch,
+    'likes': likes,
+    'links': links,
+    'regions': regions,
+}
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='yam', description="Yandex Music scripts behind a single command")
+    subparsers = parser.add_subparsers(dest='command', metavar='COMMAND', required=True)
+    for name, module in COMMANDS.items():
+        subparser = subparsers.add_parser(name, help=module.DESCRIPTION, description=module.DESCRIPTION)
+        module.add_arguments(subparser)
+        subparser.set_defaults(module=module, subparser=subparser)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None):
+    args = build_parser().parse_args(argv)
+    args.module.run_cli(args, args.subparser)
+
+
+if __name__ == "__main__":
+    main()